@@ -3,14 +3,13 @@ This module contains classes and functions to interact with the OpenAI API.
 """
 
 from collections import deque
-import os
 import typing
-import openai
 import time
 
-from printer import COLORS, ColorPrinter
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from openai_client import OpenAIClient, get_client
+from printer import COLORS
+from routing import Route, fallback_errors, get_recorder
+from sinks import ConsoleSink, NullSink, OutputSink
 
 def make_message(
     role: typing.Literal["system", "user", "assistant"], content: str
@@ -33,16 +32,27 @@ class Agent:
         max_tokens_per_call: int,
         max_history: int,
         timeout: int = 30,  # Add timeout parameter
+        client: typing.Optional[OpenAIClient] = None,
+        routes: typing.Optional[dict[str, Route]] = None,
+        sink: typing.Optional[OutputSink] = None,
         **kwargs,
     ) -> None:
         """
         Initialize the Agent object.
+
+        API calls go through `client`, or the shared client when it's None.
+        `routes` maps conversation stages to the models used for them. A
+        response, fallbacks included, must finish within `timeout` seconds.
+        Streamed output is written to `sink` (default: discarded).
         """
         self._openai_model = openai_model
         self._max_tokens = max_tokens_per_call
         self._history: deque[dict[str, str]] = deque()
         self._max_history = max_history
         self._timeout = timeout
+        self._client = client
+        self._routes = routes or {}
+        self._sink = sink or NullSink()
         self._openai_kwargs = kwargs
         self._messages: list[dict[str, str]] = []
 
@@ -60,10 +70,28 @@ class Agent:
         else:
             self._messages.append(make_message(role, content))
 
-    def generate_response(self, user_message: str = "") -> typing.Iterator[str]:
+    def _route(self, stage: typing.Optional[str]) -> Route:
+        """
+        Returns the route for a stage, falling back to the "default" route and
+        then to the agent's model.
+        """
+        if stage in self._routes:
+            return self._routes[stage]
+        if "default" in self._routes:
+            return self._routes["default"]
+        return Route([self._openai_model])
+
+    def generate_response(
+        self, user_message: str = "", stage: typing.Optional[str] = None
+    ) -> typing.Iterator[str]:
         """
         Sends the accumulated messages (permanent and history) to the OpenAI API and
         yields the assistant's response in an Iterator stream.
+
+        The model is chosen by the route for `stage`. If a model is rate limited,
+        times out or can't be reached before it has streamed any content, the
+        next model of the route is tried while time is left before the agent's
+        timeout. No attempt waits past it. Every attempt is recorded.
         """
         while len(self._history) > self._max_history:
             self._history.popleft()
@@ -71,33 +99,69 @@ class Agent:
         if user_message:
             self._history.append(make_message("user", user_message))
 
-        completion_stream = openai.ChatCompletion.create(  # type: ignore
-            model=self._openai_model,
-            max_tokens=self._max_tokens,
-            messages=self._messages + list(self._history),
-            stream=True,
-            **self._openai_kwargs,
-        )
-        for chunk in completion_stream:
-            response = chunk.choices[0]["delta"]  # type: ignore
-            if "content" not in response:
-                continue
-            message = response.content  # type: ignore
-            if self._history and self._history[-1]["role"] == "assistant":
-                self._history[-1]["content"] += message
-            else:
-                self._history.append(make_message("assistant", message))
+        client = self._client or get_client()
+        recorder = get_recorder()
+        agent_name = getattr(self, "_name", type(self).__name__)
+        route = self._route(stage)
+        messages = self._messages + list(self._history)
+        deadline = time.monotonic() + self._timeout
+        for attempt, model in enumerate(route.models):
+            is_last = attempt == len(route.models) - 1
+            openai_kwargs = dict(self._openai_kwargs)
+            remaining = deadline - time.monotonic()
+            request_timeout = remaining if route.timeout is None else min(route.timeout, remaining)
+            openai_kwargs.setdefault("request_timeout", request_timeout)
+            start_time = time.monotonic()
+            first_token = None
+            try:
+                completion_stream = client.chat_completion(
+                    model=model,
+                    max_tokens=self._max_tokens,
+                    messages=messages,
+                    stream=True,
+                    # Fail over to the next model instead of retrying this one
+                    max_retries=None if is_last else 0,
+                    **openai_kwargs,
+                )
+                for chunk in completion_stream:
+                    response = chunk.choices[0]["delta"]  # type: ignore
+                    if "content" not in response:
+                        continue
+                    message = response.content  # type: ignore
+                    if first_token is None:
+                        first_token = time.monotonic() - start_time
+                    if self._history and self._history[-1]["role"] == "assistant":
+                        self._history[-1]["content"] += message
+                    else:
+                        self._history.append(make_message("assistant", message))
 
-            yield message
+                    yield message
+            except Exception as err:
+                recorder.record(
+                    agent_name, stage, model, attempt, first_token,
+                    time.monotonic() - start_time, type(err).__name__,
+                )
+                if (
+                    is_last
+                    or first_token is not None
+                    or not isinstance(err, fallback_errors())
+                    or time.monotonic() >= deadline
+                ):
+                    raise
+                continue
+            recorder.record(
+                agent_name, stage, model, attempt, first_token, time.monotonic() - start_time
+            )
+            return
 
-    def get_full_response(self, user_message: str = "") -> str:
+    def get_full_response(self, user_message: str = "", stage: typing.Optional[str] = None) -> str:
         """
         Sends the accumulated messages (permanent and history) to the OpenAI API and
         returns the assistant's full response.
         """
         start_time = time.time()
         try:
-            messages = self.generate_response(user_message)
+            messages = self.generate_response(user_message, stage)
             response = "".join(messages)
             if time.time() - start_time > self._timeout:
                 raise TimeoutError("Response took too long")
@@ -121,8 +185,11 @@ class ColorAgent(Agent):
         **kwargs,
     ) -> None:
         """
-        Initialize the ColorAgent with a specified color.
+        Initialize the ColorAgent with a specified color. Output goes to a
+        batching console sink unless another sink is given.
         """
+        if kwargs.get("sink") is None:
+            kwargs["sink"] = ConsoleSink()
         super().__init__(
             openai_model,
             max_tokens_per_call=max_tokens_per_call,
@@ -132,15 +199,20 @@ class ColorAgent(Agent):
         self._name = name
         if color not in COLORS:
             raise ValueError(f"Agent '{name}' has an invalid color: {color}")
-        self._color_printer = ColorPrinter(color)
+        self._color = color
 
-    def generate_response(self, user_message: str = "") -> typing.Iterator[str]:
+    def generate_response(
+        self, user_message: str = "", stage: typing.Optional[str] = None
+    ) -> typing.Iterator[str]:
         """
-        Sends messages to the OpenAI API, yields the response, and prints the response
-        in the specified color.
+        Sends messages to the OpenAI API, yields the response, and writes the response
+        to the output sink in the specified color.
         """
-        self._color_printer(f"### {self._name} ###")
-        for message in super().generate_response(user_message):
-            self._color_printer(message, end="")
-            yield message
-        self._color_printer("\n\n")
+        self._sink.write(self._name, self._color, f"### {self._name} ###\n")
+        try:
+            for message in super().generate_response(user_message, stage):
+                self._sink.write(self._name, self._color, message)
+                yield message
+            self._sink.write(self._name, self._color, "\n\n")
+        finally:
+            self._sink.flush()
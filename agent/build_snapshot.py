@@ -0,0 +1,68 @@
+"""
+This module builds the startup snapshot that lets a new worker skip parsing
+the configuration, the dataset and the embeddings cache.
+
+Run it from the agent directory whenever agent.json or the dataset changes,
+e.g. as a Docker build step:
+    python build_snapshot.py agent.json
+The app ignores a snapshot built from different files.
+"""
+import argparse
+import os
+import sys
+import time
+
+import config
+from dataset_watcher import read_rows
+from snapshot import DEFAULT_PATH, load_snapshot, source_digest, write_snapshot
+
+
+def build(config_path: str, output_path: str) -> None:
+    """
+    Validate the configuration, embed the dataset and write the snapshot.
+
+    Parameters:
+        config_path (str): The path to the configuration file.
+        output_path (str): Where to write the snapshot.
+    """
+    config_file = config.read_json(config_path)
+    config.validate(config_file)
+    dataset = read_rows(config_file["dataset"])
+    kb = config.create_knowledge_base(config_file, sharded=False)
+    kb.load_dataset(dataset)
+    if kb.symptom_embeddings is None or len(kb.symptom_embeddings) != len(dataset):
+        raise RuntimeError("Could not get embeddings for every dataset row")
+
+    arrays, extra = kb.snapshot_arrays()
+    source = source_digest([config_path, config_file["dataset"]])
+    write_snapshot(output_path, config_file, dataset, arrays, source, extra)
+
+    start = time.perf_counter()
+    load_snapshot(output_path)
+    elapsed = (time.perf_counter() - start) * 1000
+    size = os.path.getsize(output_path) / 1024
+    print(f"Wrote {output_path} ({len(dataset)} rows, {size:.0f} KiB, maps in {elapsed:.1f} ms)")
+
+
+def parse_argument() -> argparse.Namespace:
+    """
+    Parse command line arguments for the snapshot build.
+
+    Returns:
+        argparse.Namespace: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Build the startup snapshot.")
+    parser.add_argument("config_file", help="Path to the JSON configuration file.")
+    parser.add_argument(
+        "-o", "--output", default=DEFAULT_PATH, help="Path of the snapshot file."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_argument()
+    try:
+        build(args.config_file, args.output)
+    except Exception as err:
+        print(f"Error: {err}")
+        sys.exit(1)
@@ -6,13 +6,19 @@ and parsing command line arguments for the program.
 import argparse
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from agent import ColorAgent
+from knowledge_base import KnowledgeBase
+from routing import Route
+from sharded_knowledge_base import ShardedKnowledgeBase
+from sinks import OutputSink, create_sink
 
 
 REQ_CONFIQ_FIELDS = ["agent_order", "agents", "max_tokens_per_call", "openai_model"]
 REQ_AGENT_FIELD = ["name", "temperature", "color", "max_history", "system", "user"]
+# Seconds an agent's response may take, route fallbacks included
+DEFAULT_RESPONSE_TIMEOUT = 30
 
 
 def read_file(file_path: str) -> str:
@@ -62,8 +68,47 @@ def validate(config_file: dict[str, Any]) -> None:
         - "agents" (list[dict]): The agents.
         - "max_tokens_per_call" (int): Tokens per call.
         - "openai_model" (str): The OpenAI model to use.
-    Optional field:
+    Optional fields:
         - "iterations" (int): The number of repetitions.
+        - "response_timeout" (float): Seconds an agent's response may take,
+          route fallbacks included (default: 30).
+        - "embedding_projection_dim" (int): Reduce embeddings to this many
+          dimensions before search (0 disables the projection).
+        - "embedding_projection_method" (str): "pca" or "random" (default: "pca").
+          PCA keeps similarities close to the full-dimension ones when the
+          dimension covers most of the data; random projection adds noise that
+          shrinks as the dimension grows. Check a threshold with
+          projection_eval.py.
+        - "symptom_neighbors" (int): Neighbors per symptom in the precomputed
+          graph that expands follow-up question and condition candidates
+          (default: 5, 0 disables the graph).
+        - "knowledge_base_shards" (int): Number of worker processes that share
+          the symptom search (0 searches in the main process).
+        - "dataset_watch_interval" (float): Seconds between checks of the
+          dataset file for edits (0 disables watching). An edit is applied
+          once the file is unchanged for one interval.
+        - "openai_client" (dict): Connection pool, retry and concurrency
+          settings passed to openai_client.OpenAIClient.
+        - "rate_limits" (dict): "requests_per_minute", "tokens_per_minute" and
+          an optional "shared_state_file" for the AdmissionScheduler.
+        - "route_log" (str): JSON Lines file recording every model call's route
+          and latency.
+        - "session_db" (str): SQLite file holding conversation messages
+          (default: "sessions.db").
+        - "session_window" (int): Recent messages each session keeps in memory
+          (default: 20).
+        - "session_ttl" (float): Seconds after its last message a session is
+          deleted (default: one week, 0 keeps sessions forever).
+        - "output_sink" (dict): Where agents echo streamed responses: {"type":
+          "console", "flush_interval": s, "max_buffer": chars}, {"type": "log",
+          "path": file} or {"type": "null"} (default: console).
+        - "prefetch" (dict): Background work between patient turns:
+          "max_workers" threads, "knowledge_hints" to add knowledge base
+          entries prefetched for earlier patient messages to the Diagnostic
+          prompt (default: false), and "speculate_after_turns" patient
+          messages after which the diagnosis and recommendation are computed
+          speculatively (0 disables speculation), at most "max_speculations"
+          times per conversation.
 
     Each agent should have the following keys:
         - "name" (str): Name of the agent
@@ -74,12 +119,18 @@ def validate(config_file: dict[str, Any]) -> None:
         - "user" (str): User message for the agent
     Optional fields
         - "top_p" (float): Top-p value for message generation (default: 1.0)
+        - "openai_model" (str): Overrides the global model for this agent
+        - "routes" (dict): Maps a conversation stage ("follow_up", "diagnosis",
+          "recommendation", "explanation" or "default") to a model, a list of
+          fallback models, or {"models": [...], "timeout": seconds}. A route
+          with fallbacks needs a timeout below "response_timeout", or a slow
+          model leaves its fallbacks no time.
 
     Args:
         config_file (dict[str, Any]): JSON file with the
 
     Raises:
-        ValueError: If JSON file is missing a field.
+        ValueError: If JSON file is missing a field or has an invalid route.
     """
     # Validation for required fields in JSON file
     for field in REQ_CONFIQ_FIELDS:
@@ -87,6 +138,7 @@ def validate(config_file: dict[str, Any]) -> None:
             raise ValueError(
                 f"'{field}' is missing in the main JSON configuration file"
             )
+    response_timeout = config_file.get("response_timeout", DEFAULT_RESPONSE_TIMEOUT)
     # Validation for agents in JSON file
     for agent_config in config_file["agents"]:
         for field in REQ_AGENT_FIELD:
@@ -94,15 +146,31 @@ def validate(config_file: dict[str, Any]) -> None:
                 raise ValueError(
                     f"'{field}' is missing in the agent JSON configuration file"
                 )
+        for stage, route_config in agent_config.get("routes", {}).items():
+            try:
+                route = Route.from_config(route_config)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(
+                    f"Invalid route '{stage}' for agent '{agent_config['name']}'"
+                )
+            if len(route.models) > 1 and (route.timeout or response_timeout) >= response_timeout:
+                raise ValueError(
+                    f"Route '{stage}' for agent '{agent_config['name']}' needs a timeout "
+                    f"below the {response_timeout}s response timeout to reach its fallbacks"
+                )
 
 
-def create_coloragents(config: dict) -> dict[str, ColorAgent]:
+def create_coloragents(
+    config: dict, sink: Optional[OutputSink] = None
+) -> dict[str, ColorAgent]:
     """
     Create ColorAgent instances based on the provided configuration.
 
     Parameters:
         agents_config (list[dict]): List of dictionaries
         representing agent configurations.
+        sink (OutputSink): Sink for the agents' output, instead of the
+        configured "output_sink".
 
     Returns:
         dict[str, ColorAgent]: A dictionary mapping agent names to ColorAgent instances.
@@ -111,15 +179,23 @@ def create_coloragents(config: dict) -> dict[str, ColorAgent]:
     """
 
     agents: dict[str, ColorAgent] = {}
+    if sink is None:
+        sink = create_sink(config.get("output_sink", {"type": "console"}))
     for agent_config in config["agents"]:
         agent = ColorAgent(
             name=agent_config["name"],
             color=agent_config["color"],
-            openai_model=config["openai_model"],
+            openai_model=agent_config.get("openai_model", config["openai_model"]),
             max_tokens_per_call=config["max_tokens_per_call"],
             max_history=agent_config["max_history"],
             top_p=agent_config.get("top_p", 1.0),
             temperature=agent_config["temperature"],
+            timeout=config.get("response_timeout", DEFAULT_RESPONSE_TIMEOUT),
+            routes={
+                stage: Route.from_config(route_config)
+                for stage, route_config in agent_config.get("routes", {}).items()
+            },
+            sink=sink,
         )
         if "system" in agent_config:
             agent.append_message("system", agent_config["system"], False)
@@ -129,6 +205,28 @@ def create_coloragents(config: dict) -> dict[str, ColorAgent]:
     return agents
 
 
+def create_knowledge_base(config: dict, sharded: bool = True) -> KnowledgeBase:
+    """
+    Create an empty KnowledgeBase based on the provided configuration.
+
+    Parameters:
+        config (dict): The configuration.
+        sharded (bool): Whether "knowledge_base_shards" may start worker processes.
+
+    Returns:
+        KnowledgeBase: The knowledge base, without a dataset loaded.
+    """
+    kwargs = {
+        "projection_dim": config.get("embedding_projection_dim") or None,
+        "projection_method": config.get("embedding_projection_method", "pca"),
+        "neighbor_k": config.get("symptom_neighbors", 5),
+    }
+    num_shards = config.get("knowledge_base_shards", 0)
+    if sharded and num_shards:
+        return ShardedKnowledgeBase(num_shards=num_shards, **kwargs)
+    return KnowledgeBase(**kwargs)
+
+
 def parse_argument() -> argparse.Namespace:
     """
     Parse command line arguments for the program.
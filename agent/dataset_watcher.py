@@ -0,0 +1,125 @@
+"""
+This module watches the symptoms CSV file and applies edits to a running
+KnowledgeBase without re-embedding unchanged symptoms or restarting.
+"""
+import csv
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from knowledge_base import KnowledgeBase
+
+
+def read_rows(dataset_path: str) -> List[Dict[str, Any]]:
+    """
+    Read the dataset CSV file.
+
+    Parameters:
+        dataset_path (str): The path to the dataset file.
+
+    Returns:
+        list[dict[str, Any]]: The dataset rows.
+    """
+    with open(os.path.normpath(dataset_path), mode='r', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+
+def diff_rows(
+    old_rows: List[Dict[str, Any]], new_rows: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Compare two versions of the dataset by lowercased symptom text.
+
+    A row whose symptom text changed shows up as a removal of the old symptom
+    and an upsert of the new one. A row where only the conditions or follow-up
+    questions changed is an upsert of an existing symptom, which the
+    KnowledgeBase applies without embedding anything.
+
+    Returns:
+        tuple[list[dict[str, Any]], list[str]]: Rows to upsert and symptoms to remove.
+    """
+    old = {row['symptom'].lower(): row for row in old_rows}
+    new = {row['symptom'].lower(): row for row in new_rows}
+    upserts = [row for key, row in new.items() if old.get(key) != row]
+    removals = [key for key in old if key not in new]
+    return upserts, removals
+
+
+class DatasetWatcher(threading.Thread):
+    """
+    A daemon thread that polls the dataset file and patches the KnowledgeBase.
+
+    A change is applied once the file's modification time and size are the
+    same on two consecutive polls, so a file that is still being written is
+    never read half-way.
+    """
+
+    def __init__(
+        self, kb: KnowledgeBase, dataset_path: str, interval: float = 5.0
+    ) -> None:
+        """
+        Initialize the watcher.
+
+        Parameters:
+            kb (KnowledgeBase): The knowledge base to update.
+            dataset_path (str): The path to the dataset file.
+            interval (float): Seconds between checks of the file's modification time.
+        """
+        super().__init__(name="DatasetWatcher", daemon=True)
+        self._kb = kb
+        self._dataset_path = dataset_path
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._rows = list(kb.dataset or [])
+        self._applied = self._get_signature()
+        self._pending: Optional[Tuple[float, int]] = None
+
+    def _get_signature(self) -> Tuple[float, int]:
+        """The file's modification time and size."""
+        try:
+            stat = os.stat(self._dataset_path)
+        except FileNotFoundError:
+            return (0.0, 0)
+        return (stat.st_mtime, stat.st_size)
+
+    def check(self) -> bool:
+        """
+        Apply the changes if the file was modified and has not changed since
+        the previous check.
+
+        Returns:
+            bool: True if a new index version was published.
+        """
+        signature = self._get_signature()
+        if signature == self._applied:
+            self._pending = None
+            return False
+        if signature != self._pending:
+            # Possibly still being written; apply it if it is the same next time
+            self._pending = signature
+            return False
+        try:
+            rows = read_rows(self._dataset_path)
+            upserts, removals = diff_rows(self._rows, rows)
+            if upserts or removals:
+                version = self._kb.apply_changes(upserts, removals)
+                print(
+                    f"Dataset updated to version {version}: "
+                    f"{len(upserts)} added or changed, {len(removals)} removed"
+                )
+        except Exception as err:
+            # Keep serving the current version; the next poll retries
+            print(f"An error occurred while updating '{self._dataset_path}': {err}")
+            return False
+        self._applied = signature
+        self._pending = None
+        self._rows = rows
+        return bool(upserts or removals)
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self._interval):
+            self.check()
+
+    def stop(self) -> None:
+        """Stop polling."""
+        self._stop_event.set()
@@ -1,17 +1,142 @@
 import numpy as np
-from typing import List, Dict, Any
-import openai
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
 import json
 import os
+import threading
+
+from neighbor_graph import NeighborGraph
+from openai_client import OpenAIClient, get_client
+from projection import Projection, fingerprint
+from snapshot import Snapshot
+
+Match = Tuple[int, float]
+
+
+def top_matches(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    threshold: float,
+    top_k: Optional[int] = None,
+    offset: int = 0,
+) -> List[List[Match]]:
+    """
+    Score unit-length query vectors against unit-length rows.
+
+    Returns, for each query, (row index + offset, similarity) pairs at or above
+    the threshold, best first, cut to `top_k` when given.
+    """
+    scores = queries @ matrix.T
+    results = []
+    for row in scores:
+        candidates = np.flatnonzero(row >= threshold)
+        if top_k is not None and len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-row[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-row[candidates], kind="stable")]
+        results.append([(int(idx) + offset, float(row[idx])) for idx in candidates])
+    return results
+
+
+class _Index:
+    """
+    An immutable snapshot of the searchable dataset.
+
+    Updates build a new snapshot and swap it in with one attribute assignment,
+    so a search that has picked up a snapshot always sees rows, embeddings,
+    search matrix and the projection its queries need from the same version.
+    """
+
+    __slots__ = (
+        "version", "dataset", "keys", "embeddings", "search_matrix", "graph", "projection"
+    )
+
+    def __init__(
+        self,
+        version: int,
+        dataset: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        search_matrix: np.ndarray,
+        graph: Optional[NeighborGraph] = None,
+        projection: Optional[Projection] = None,
+    ) -> None:
+        self.version = version
+        self.dataset = dataset
+        self.keys = [entry['symptom'].lower() for entry in dataset]
+        self.embeddings = embeddings
+        self.search_matrix = search_matrix
+        self.graph = graph
+        self.projection = projection
+
 
 class KnowledgeBase:
-    def __init__(self, cache_file: str = "embeddings_cache.json"):
-        """Initialize knowledge base with caching."""
+    def __init__(
+        self,
+        cache_file: str = "embeddings_cache.json",
+        projection_dim: Optional[int] = None,
+        projection_method: str = "pca",
+        client: Optional[OpenAIClient] = None,
+        neighbor_k: int = 5,
+    ):
+        """
+        Initialize knowledge base with caching.
+
+        When `projection_dim` is set, dataset and query embeddings are projected
+        to that many dimensions (PCA or random projection) before search. The
+        fitted projection is persisted next to the embeddings cache. Embeddings
+        are requested through `client`, or the shared client when it's None.
+        Every symptom's `neighbor_k` most similar symptoms are precomputed and
+        persisted next to the cache as well (0 disables the graph).
+        """
         self.cache_file = cache_file
-        self.embeddings_cache = self._load_cache()
-        self.dataset = None
-        self.symptom_embeddings = None
-        
+        self.client = client
+        self._embeddings_cache: Optional[Dict[str, List[float]]] = None
+        self.projection_dim = projection_dim
+        self.projection_method = projection_method
+        self.projection_file = os.path.splitext(cache_file)[0] + ".projection.npz"
+        self.neighbor_k = neighbor_k
+        self.graph_file = os.path.splitext(cache_file)[0] + ".neighbors.npz"
+        self._index: Optional[_Index] = None
+        self._write_lock = threading.Lock()
+        self._cache_lock = threading.RLock()
+
+    @property
+    def embeddings_cache(self) -> Dict[str, List[float]]:
+        """The embeddings cache, read from file on first use."""
+        if self._embeddings_cache is None:
+            with self._cache_lock:
+                if self._embeddings_cache is None:
+                    self._embeddings_cache = self._load_cache()
+        return self._embeddings_cache
+
+    @property
+    def dataset(self) -> Optional[List[Dict[str, Any]]]:
+        """Rows of the current index version."""
+        return self._index.dataset if self._index else None
+
+    @property
+    def symptom_embeddings(self) -> Optional[np.ndarray]:
+        """Full-dimension symptom embeddings of the current index version."""
+        return self._index.embeddings if self._index else None
+
+    @property
+    def graph(self) -> Optional[NeighborGraph]:
+        """Symptom neighbor graph of the current index version."""
+        return self._index.graph if self._index else None
+
+    @property
+    def projection(self) -> Optional[Projection]:
+        """Projection of the current index version, if any."""
+        return self._index.projection if self._index else None
+
+    @property
+    def _search_matrix(self) -> Optional[np.ndarray]:
+        return self._index.search_matrix if self._index else None
+
+    @property
+    def version(self) -> int:
+        """Version of the current index; bumped by every update."""
+        return self._index.version if self._index else 0
+
     def _load_cache(self) -> Dict[str, List[float]]:
         """Load embeddings cache from file."""
         if os.path.exists(self.cache_file):
@@ -21,14 +146,228 @@ class KnowledgeBase:
 
     def _save_cache(self):
         """Save embeddings cache to file."""
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.embeddings_cache, f)
+        with self._cache_lock:
+            with open(self.cache_file, 'w') as f:
+                json.dump(self.embeddings_cache, f)
 
     def load_dataset(self, dataset: List[Dict[str, Any]]):
         """Load and process the dataset, creating embeddings for symptoms."""
-        self.dataset = dataset
         symptoms = [entry['symptom'].lower() for entry in dataset]
-        self.symptom_embeddings = self._get_embeddings(symptoms)
+        embeddings = np.asarray(self._get_embeddings(symptoms), dtype=np.float32)
+        with self._write_lock:
+            projection = None
+            if self.projection_dim:
+                projection = self._load_projection(symptoms, embeddings)
+            search_matrix = self._search_vectors(embeddings, projection)
+            graph = self._load_graph(symptoms, search_matrix)
+            self._publish(_Index(
+                self.version + 1, list(dataset), embeddings, search_matrix, graph, projection
+            ))
+
+    def load_snapshot(self, snapshot: Snapshot) -> None:
+        """
+        Load the dataset and arrays of a prebuilt snapshot without embedding
+        anything or reading the embeddings cache.
+        """
+        arrays = snapshot.arrays
+        with self._write_lock:
+            projection = None
+            if "projection_components" in arrays:
+                projection = Projection(
+                    snapshot.header["projection_method"],
+                    np.asarray(arrays["projection_mean"]),
+                    np.asarray(arrays["projection_components"]),
+                    snapshot.header["projection_source"],
+                )
+            graph = None
+            if "neighbor_indices" in arrays:
+                graph = NeighborGraph(
+                    arrays["neighbor_indices"],
+                    arrays["neighbor_similarities"],
+                    snapshot.header["neighbor_k"],
+                    snapshot.header["neighbor_source"],
+                )
+            self._publish(_Index(
+                self.version + 1,
+                list(snapshot.dataset),
+                arrays["embeddings"],
+                arrays["search_matrix"],
+                graph,
+                projection,
+            ))
+
+    def snapshot_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Return the arrays and metadata `load_snapshot` needs to restore the
+        current index.
+        """
+        index = self._index
+        arrays = {"embeddings": index.embeddings, "search_matrix": index.search_matrix}
+        extra: Dict[str, Any] = {}
+        if index.projection is not None:
+            arrays["projection_mean"] = index.projection.mean
+            arrays["projection_components"] = index.projection.components
+            extra["projection_method"] = index.projection.method
+            extra["projection_source"] = index.projection.source
+        if index.graph is not None:
+            arrays["neighbor_indices"] = index.graph.indices
+            arrays["neighbor_similarities"] = index.graph.similarities
+            extra["neighbor_k"] = index.graph.k
+            extra["neighbor_source"] = index.graph.source
+        return arrays, extra
+
+    def apply_changes(
+        self, upserts: List[Dict[str, Any]] = (), removals: List[str] = ()
+    ) -> int:
+        """
+        Add, update and remove dataset rows as one new index version.
+
+        Rows are keyed by their lowercased symptom text. An upsert whose key is
+        already indexed only replaces the row's other fields and reuses its
+        embedding; only new symptom text is embedded. The neighbor graph is
+        rebuilt when rows are added or removed. The current snapshot is
+        never modified: kept rows are copied into a new one, which is then
+        swapped in atomically.
+
+        Parameters:
+            upserts (list[dict[str, Any]]): Rows to add or update.
+            removals (list[str]): Symptoms whose rows are removed.
+
+        Returns:
+            int: The index version after the changes.
+
+        Raises:
+            RuntimeError: If embeddings for new symptoms can't be fetched.
+        """
+        with self._write_lock:
+            index = self._index
+            if index is None:
+                raise RuntimeError("No dataset loaded")
+            removed = {symptom.lower() for symptom in removals}
+            changed = {entry['symptom'].lower(): entry for entry in upserts}
+
+            keep = [i for i, key in enumerate(index.keys) if key not in removed]
+            kept_keys = {index.keys[i] for i in keep}
+            added = [entry for key, entry in changed.items() if key not in kept_keys]
+            dataset = [changed.get(index.keys[i], index.dataset[i]) for i in keep] + added
+
+            embeddings = index.embeddings[keep]
+            search_matrix = index.search_matrix[keep]
+            if added:
+                new_embeddings = self._get_embeddings([entry['symptom'].lower() for entry in added])
+                if new_embeddings is None:
+                    raise RuntimeError("Could not get embeddings for the new symptoms")
+                new_embeddings = np.asarray(new_embeddings, dtype=np.float32)
+                embeddings = np.vstack([embeddings, new_embeddings])
+                new_rows = self._search_vectors(new_embeddings, index.projection)
+                search_matrix = np.vstack([search_matrix, new_rows])
+
+            graph = index.graph
+            if added or len(keep) < len(index.keys):
+                symptoms = [entry['symptom'].lower() for entry in dataset]
+                graph = self._load_graph(symptoms, search_matrix)
+            self._publish(_Index(
+                index.version + 1, dataset, embeddings, search_matrix, graph, index.projection
+            ))
+            return index.version + 1
+
+    def add_entry(self, entry: Dict[str, Any]) -> int:
+        """Add a row, or update it if its symptom is already indexed."""
+        return self.apply_changes(upserts=[entry])
+
+    def update_entry(self, entry: Dict[str, Any]) -> int:
+        """Update the row with the same symptom."""
+        index = self._index
+        if index is None:
+            raise RuntimeError("No dataset loaded")
+        if entry['symptom'].lower() not in index.keys:
+            raise KeyError(f"Symptom not in knowledge base: {entry['symptom']}")
+        return self.apply_changes(upserts=[entry])
+
+    def remove_entry(self, symptom: str) -> int:
+        """Remove the rows for a symptom."""
+        return self.apply_changes(removals=[symptom])
+
+    def _publish(self, index: _Index) -> None:
+        """Make a new index version visible to searches."""
+        self._index = index
+
+    def _load_projection(self, symptoms: List[str], embeddings: np.ndarray) -> Projection:
+        """Load the persisted projection, refitting it if the dataset or settings changed."""
+        source = fingerprint(symptoms)
+        projection = Projection.load(self.projection_file)
+        if (
+            projection is None
+            or projection.source != source
+            or projection.method != self.projection_method
+            or projection.components.shape[0] != embeddings.shape[1]
+            or projection.requested_dim != self.projection_dim
+        ):
+            projection = Projection.fit(
+                embeddings, self.projection_dim, self.projection_method, source
+            )
+            projection.save(self.projection_file)
+        return projection
+
+    def _load_graph(self, symptoms: List[str], search_matrix: np.ndarray) -> Optional[NeighborGraph]:
+        """Load the persisted neighbor graph, rebuilding it if the rows or settings changed."""
+        if not self.neighbor_k:
+            return None
+        # Neighbors are found in the search space, so any change to it is part of the source
+        matrix = np.ascontiguousarray(search_matrix, dtype=np.float32)
+        source = fingerprint(
+            symptoms + [str(matrix.shape), hashlib.sha1(matrix.tobytes()).hexdigest()]
+        )
+        graph = NeighborGraph.load(self.graph_file)
+        if graph is None or graph.source != source or graph.k != self.neighbor_k:
+            graph = NeighborGraph.build(search_matrix, self.neighbor_k, source)
+            graph.save(self.graph_file)
+        return graph
+
+    def _expand(self, index: _Index, matches: List[Match], threshold: float) -> List[Match]:
+        """
+        Append the graph neighbors of the matched rows, scored by the match
+        similarity times the edge similarity. Costs O(k) per match, with no
+        embedding calls or scans.
+        """
+        if index.graph is None or not matches:
+            return matches
+        seen = {idx for idx, _ in matches}
+        related: Dict[int, float] = {}
+        for idx, similarity in matches:
+            for neighbor, edge in index.graph.neighbors(idx):
+                if edge < threshold:
+                    break
+                if neighbor not in seen:
+                    related[neighbor] = max(related.get(neighbor, 0.0), similarity * edge)
+        return matches + sorted(related.items(), key=lambda item: -item[1])
+
+    @classmethod
+    def _search_vectors(
+        cls, embeddings: np.ndarray, projection: Optional[Projection]
+    ) -> np.ndarray:
+        """
+        Turn embeddings into search matrix rows or query vectors, whose dot
+        products are the full-dimension cosine similarities, or estimates of
+        them when projected.
+
+        PCA components are orthonormal, so unit-length vectors are projected
+        without renormalizing: dividing by the norm of a projection, which is
+        below 1, would inflate similarities. Random projection only keeps
+        norms approximately, so its outputs are renormalized instead.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if projection is None:
+            return cls._normalize(embeddings)
+        if projection.method == "pca":
+            return projection.transform(cls._normalize(embeddings))
+        return cls._normalize(projection.transform(embeddings))
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        """Scale vectors to unit length so a dot product is the cosine similarity."""
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
 
     def _get_embeddings(self, texts: List[str]) -> np.ndarray:
         """Get embeddings with batching and caching."""
@@ -47,7 +386,8 @@ class KnowledgeBase:
         # Batch process new embeddings
         if texts_to_embed:
             try:
-                response = openai.Embedding.create(
+                client = self.client or get_client()
+                response = client.embedding(
                     input=texts_to_embed,
                     model="text-embedding-ada-002"
                 )
@@ -56,7 +396,8 @@ class KnowledgeBase:
                 for i, embedding_data in enumerate(response['data']):
                     text = texts_to_embed[i]
                     embedding = embedding_data['embedding']
-                    self.embeddings_cache[text] = embedding
+                    with self._cache_lock:
+                        self.embeddings_cache[text] = embedding
                     embeddings.insert(indices[i], embedding)
                 
                 # Save updated cache
@@ -72,29 +413,65 @@ class KnowledgeBase:
         """Calculate cosine similarity between two vectors."""
         return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
-    def get_relevant_entries(self, query: str, threshold: float = 0.7) -> List[Dict[str, Any]]:
+    def _search(
+        self, query_embeddings: np.ndarray, threshold: float, top_k: Optional[int]
+    ) -> Tuple[_Index, List[List[Match]]]:
+        """
+        Score full-dimension query embeddings against the dataset, projected
+        with the projection of the index snapshot they are scored against.
+
+        Returns the index snapshot that was searched along with the matches,
+        so row numbers are resolved against the same version.
+        """
+        index = self._index
+        query_vectors = self._search_vectors(query_embeddings, index.projection)
+        return index, top_matches(index.search_matrix, query_vectors, threshold, top_k)
+
+    def get_relevant_entries_batch(
+        self,
+        queries: List[str],
+        threshold: float = 0.7,
+        top_k: Optional[int] = None,
+        expand: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Get relevant dataset entries for several queries in one search.
+
+        With `expand`, the matches are followed by their neighbors in the
+        symptom graph whose edge similarity reaches the threshold.
+        """
+        query_embeddings = self._get_embeddings([query.lower() for query in queries])
+        if query_embeddings is None:
+            raise RuntimeError("Could not get embeddings for the queries")
+        index, results = self._search(query_embeddings, threshold, top_k)
+        if expand:
+            results = [self._expand(index, matches, threshold) for matches in results]
+        return [
+            [{**index.dataset[idx], 'similarity': similarity} for idx, similarity in matches]
+            for matches in results
+        ]
+
+    def get_relevant_entries(
+        self,
+        query: str,
+        threshold: float = 0.7,
+        top_k: Optional[int] = None,
+        expand: bool = False,
+    ) -> List[Dict[str, Any]]:
         """Get relevant dataset entries based on semantic similarity."""
-        query_embedding = self._get_embeddings([query.lower()])[0]
-        
-        relevant_entries = []
-        for idx, entry in enumerate(self.dataset):
-            similarity = self._cosine_similarity(query_embedding, self.symptom_embeddings[idx])
-            if similarity >= threshold:
-                relevant_entries.append({**entry, 'similarity': similarity})
-        
-        return sorted(relevant_entries, key=lambda x: x['similarity'], reverse=True)
+        return self.get_relevant_entries_batch([query], threshold, top_k, expand)[0]
 
     def get_relevant_questions(self, query: str, threshold: float = 0.7) -> List[str]:
-        """Get relevant follow-up questions based on semantic similarity."""
-        relevant_entries = self.get_relevant_entries(query, threshold)
+        """Get relevant follow-up questions of matching and neighboring symptoms."""
+        relevant_entries = self.get_relevant_entries(query, threshold, expand=True)
         questions = []
         for entry in relevant_entries:
             questions.extend([q.strip() for q in entry['follow_up_questions'].split(';')])
         return list(dict.fromkeys(questions))  # Remove duplicates while preserving order
 
     def get_possible_conditions(self, query: str, threshold: float = 0.7) -> List[str]:
-        """Get possible conditions based on semantic similarity."""
-        relevant_entries = self.get_relevant_entries(query, threshold)
+        """Get possible conditions of matching and neighboring symptoms."""
+        relevant_entries = self.get_relevant_entries(query, threshold, expand=True)
         conditions = []
         for entry in relevant_entries:
             conditions.extend([c.strip() for c in entry['conditions'].split(',')])
@@ -1,11 +1,15 @@
+import startup
+
+# Must run before the other imports so their cost shows up in the profile
+startup.enable_profiling_from_env()
+
 import json
 import os
 import sys
 from dotenv import load_dotenv
-import openai
 import csv
 import streamlit as st
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional
 import io
 import contextlib
 from datetime import datetime
@@ -15,14 +19,26 @@ import asyncio
 from concurrent.futures import TimeoutError
 
 import config
+import openai_client
 import readinput
+import routing
+import scheduler
+import snapshot
+from dataset_watcher import DatasetWatcher
 from knowledge_base import KnowledgeBase
+from prefetch import Prefetcher, PrefetchState, Speculate, Turn, collect, transcript_line
+from session_store import Message, SessionStore
+from sinks import NullSink
 
 TASK = """
 The task is the following:
 {}
 """
 
+DIAGNOSIS_REQUEST = "Please provide the diagnosis now."
+# Knowledge base questions and conditions given to the Diagnostic agent
+MAX_HINTS = 8
+
 def fetch_validated_config(config_path: str) -> dict:
     """
     Load and validate the configuration from a specified file path.
@@ -83,6 +99,129 @@ def load_dataset(dataset_path: str) -> List[Dict[str, Any]]:
     return dataset
 
 
+@st.cache_resource
+def configure_openai_client(settings: dict, rate_limits: dict) -> openai_client.OpenAIClient:
+    """
+    Build the shared OpenAI client once per process from the "openai_client"
+    and "rate_limits" configuration, so reruns keep its connection pool, retry
+    budget and admission queue.
+
+    Parameters:
+        settings (dict): Keyword arguments for OpenAIClient.
+        rate_limits (dict): Keyword arguments for AdmissionScheduler; empty
+            disables rate limiting.
+
+    Returns:
+        OpenAIClient: The shared client.
+    """
+    return openai_client.configure(rate_limits=rate_limits or None, **settings)
+
+
+@st.cache_resource
+def configure_route_recorder(log_file: str) -> routing.RouteRecorder:
+    """
+    Create the shared recorder of model routes and latencies once per process.
+
+    Parameters:
+        log_file (str): JSON Lines file the records are appended to, or "".
+
+    Returns:
+        RouteRecorder: The shared recorder.
+    """
+    return routing.configure_recorder(log_file or None)
+
+
+@st.cache_resource
+def create_session_store(db_path: str, window: int, ttl: float) -> SessionStore:
+    """
+    Open the conversation store shared by all sessions in this process.
+
+    Parameters:
+        db_path (str): Path to the SQLite database file.
+        window (int): Recent messages each session keeps in memory.
+        ttl (float): Seconds idle sessions are kept (0 keeps them forever).
+
+    Returns:
+        SessionStore: The shared store.
+    """
+    return SessionStore(db_path, window, ttl or None)
+
+
+@st.cache_resource
+def load_startup_snapshot(config_path: str) -> Optional[snapshot.Snapshot]:
+    """
+    Map the prebuilt startup snapshot once per process.
+
+    The snapshot is used only if it was built from the current configuration
+    and dataset files; otherwise None is returned and startup parses them.
+
+    Parameters:
+        config_path (str): The path to the configuration file.
+
+    Returns:
+        Snapshot: The mapped snapshot, or None.
+    """
+    return snapshot.load_current_snapshot(
+        os.getenv("RAG_SNAPSHOT", snapshot.DEFAULT_PATH), config_path
+    )
+
+
+@st.cache_resource
+def create_knowledge_base(
+    config_file: dict,
+    dataset: List[Dict[str, Any]],
+    _startup_snapshot: Optional[snapshot.Snapshot] = None,
+) -> KnowledgeBase:
+    """
+    Create the knowledge base once per process and load the dataset into it.
+
+    A positive "knowledge_base_shards" setting selects the multi-process
+    ShardedKnowledgeBase; otherwise searches run in this process. A positive
+    "dataset_watch_interval" starts a DatasetWatcher that applies edits to the
+    dataset file while the app is running.
+
+    Parameters:
+        config_file (dict): The validated configuration.
+        dataset (list[dict[str, Any]]): The loaded dataset.
+        _startup_snapshot (Snapshot): Prebuilt arrays to map instead of
+            embedding the dataset (not hashed by the cache).
+
+    Returns:
+        KnowledgeBase: The knowledge base with the dataset loaded.
+    """
+    kb = config.create_knowledge_base(config_file)
+    if _startup_snapshot is not None:
+        kb.load_snapshot(_startup_snapshot)
+    else:
+        kb.load_dataset(dataset)
+    watch_interval = config_file.get("dataset_watch_interval", 0)
+    if watch_interval:
+        DatasetWatcher(kb, config_file["dataset"], watch_interval).start()
+    return kb
+
+
+@st.cache_resource
+def create_prefetcher(_kb: KnowledgeBase, settings: dict, threshold: float) -> Prefetcher:
+    """
+    Create the prefetcher shared by all sessions once per process.
+
+    Parameters:
+        _kb (KnowledgeBase): The knowledge base whose retrieval is warmed (not
+            hashed by the cache). Only used with "knowledge_hints" enabled.
+        settings (dict): The "prefetch" configuration.
+        threshold (float): Similarity threshold of the retrieval.
+
+    Returns:
+        Prefetcher: The shared prefetcher.
+    """
+    return Prefetcher(
+        _kb if settings.get("knowledge_hints", False) else None,
+        settings.get("max_workers", 2),
+        threshold,
+        settings.get("max_speculations", 2),
+    )
+
+
 def fetch_task(task_text: str, mvp_path: str) -> str:
     """
     Load a task from a given text input or, if not provided, request it from the user.
@@ -107,7 +246,7 @@ def fetch_task(task_text: str, mvp_path: str) -> str:
     print()
     return task
 
-def initialize_session_state():
+def initialize_session_state(store: SessionStore):
     """Initialize all session state variables"""
     if 'patient_data' not in st.session_state:
         st.session_state['patient_data'] = None
@@ -135,21 +274,22 @@ def initialize_session_state():
         st.session_state['is_processing'] = False
     if 'last_input' not in st.session_state:
         st.session_state['last_input'] = None
-    if 'chat_messages' not in st.session_state:
-        st.session_state['chat_messages'] = []
-    if 'asked_questions' not in st.session_state:
-        st.session_state['asked_questions'] = []
-    if 'patient_answers' not in st.session_state:
-        st.session_state['patient_answers'] = {}
+    if 'chat_session' not in st.session_state:
+        st.session_state['chat_session'] = store.session()
+    if 'show_earlier' not in st.session_state:
+        st.session_state['show_earlier'] = False
     if 'conversation_stage' not in st.session_state:
         st.session_state['conversation_stage'] = 'diagnostic'
     if 'diagnosis_complete' not in st.session_state:
         st.session_state['diagnosis_complete'] = False
     if 'force_diagnosis' not in st.session_state:
         st.session_state['force_diagnosis'] = False
+    if 'prefetch' not in st.session_state:
+        st.session_state['prefetch'] = PrefetchState()
 
-def reset_session():
+def reset_session(prefetcher: Prefetcher):
     """Reset the session state for a new conversation"""
+    prefetcher.reset(st.session_state['prefetch'])
     st.session_state['current_agent_index'] = 0
     st.session_state['questions_asked'] = 0
     st.session_state['patient_data'] = None
@@ -159,9 +299,8 @@ def reset_session():
     st.session_state['iteration'] = 1
     st.session_state['collecting_user_input'] = True
     st.session_state['input_key'] += 1
-    st.session_state['chat_messages'] = []
-    st.session_state['asked_questions'] = []
-    st.session_state['patient_answers'] = {}
+    st.session_state['chat_session'].clear()
+    st.session_state['show_earlier'] = False
     st.session_state['conversation_stage'] = 'diagnostic'
     st.session_state['diagnosis_complete'] = False
 
@@ -204,18 +343,36 @@ def collect_patient_profile():
             return True
     return False
 
-def get_agent_prompt(agent_name: str, dataset: List[Dict[str, Any]]) -> str:
-    """Generate appropriate prompt based on agent type and conversation stage"""
-    profile = st.session_state.get('patient_data', {})
-    conversation_context = "\n".join([
-        f"{'Patient' if msg[0] == 'user' else msg[0].capitalize()}: {msg[1]}"
-        for msg in st.session_state.chat_messages
-    ])
-    
+def patient_queries(turns: List[Turn]) -> List[str]:
+    """The patient's messages, used to look up the knowledge base."""
+    return [content for kind, content in turns if kind == "user" and content != DIAGNOSIS_REQUEST]
+
+def knowledge_hints(entries: List[List[Dict[str, Any]]]) -> str:
+    """Summarize the knowledge base entries matching the patient's messages for a prompt."""
+    questions, conditions = [], []
+    for matches in entries:
+        for entry in matches:
+            questions.extend(q.strip() for q in entry['follow_up_questions'].split(';'))
+            conditions.extend(c.strip() for c in entry['conditions'].split(','))
+    questions = list(dict.fromkeys(q for q in questions if q))[:MAX_HINTS]
+    conditions = list(dict.fromkeys(c for c in conditions if c))[:MAX_HINTS]
+    if not questions and not conditions:
+        return ""
+    return (
+        "Reference data for the symptoms described:\n"
+        f"- Possible conditions: {', '.join(conditions) or 'none'}\n"
+        f"- Relevant follow-up questions: {'; '.join(questions) or 'none'}\n\n"
+    )
+
+def build_agent_prompt(
+    agent_name: str, conversation_context: str, force_diagnosis: bool = False, hints: str = ""
+) -> str:
+    """Build an agent's prompt from the conversation transcript"""
     if agent_name == "DiagnosticAgent":
-        if st.session_state.get('force_diagnosis', False):
+        if force_diagnosis:
             return (
                 f"You are conducting a medical diagnosis. Review this conversation:\n\n{conversation_context}\n\n"
+                f"{hints}"
                 "The patient has requested a diagnosis. Based on the information gathered:\n"
                 "1. Provide a clear and concise diagnostic assessment\n"
                 "2. End with '[DIAGNOSIS_COMPLETE]'\n"
@@ -224,6 +381,7 @@ def get_agent_prompt(agent_name: str, dataset: List[Dict[str, Any]]) -> str:
         else:
             return (
                 f"You are conducting a medical diagnosis. Review this conversation:\n\n{conversation_context}\n\n"
+                f"{hints}"
                 "Based on the symptoms and responses, ask a relevant follow-up question to gather more information.\n"
                 "Be concise and focused. Never repeat questions already asked."
             )
@@ -244,18 +402,101 @@ def get_agent_prompt(agent_name: str, dataset: List[Dict[str, Any]]) -> str:
             "End with '[EXPLANATION_COMPLETE]'"
         )
 
+def get_agent_prompt(agent_name: str, dataset: List[Dict[str, Any]], prefetcher: Prefetcher) -> str:
+    """Generate appropriate prompt based on agent type and conversation stage"""
+    state = st.session_state['prefetch']
+    turns = prefetcher.transcript(state, st.session_state.chat_session)
+    hints = ""
+    if agent_name == "DiagnosticAgent":
+        # Only what was warmed between turns, so the patient never waits on retrieval
+        entries = prefetcher.relevant_entries(state, patient_queries(turns), prefetched_only=True)
+        hints = knowledge_hints(entries)
+    return build_agent_prompt(
+        agent_name,
+        prefetcher.context(state, turns),
+        st.session_state.get('force_diagnosis', False),
+        hints,
+    )
+
+def speculate_diagnosis(config_file: dict, prefetcher: Prefetcher, state: PrefetchState) -> Speculate:
+    """
+    Speculate on what "Complete Diagnosis" will produce: the diagnosis and,
+    if it completes, the recommendations.
+    """
+    def speculate(turns: List[Turn], cancelled) -> Optional[Dict[str, str]]:
+        # Private agents, so speculative output isn't echoed or mixed into live history
+        agents = config.create_coloragents(config_file, sink=NullSink())
+        turns = turns + [("user", DIAGNOSIS_REQUEST)]
+        entries = prefetcher.relevant_entries(state, patient_queries(turns), record=False)
+        prompt = build_agent_prompt(
+            "DiagnosticAgent",
+            "\n".join(transcript_line(*turn) for turn in turns),
+            True,
+            knowledge_hints(entries),
+        )
+        diagnosis = collect(agents["DiagnosticAgent"].generate_response(prompt, "diagnosis"), cancelled)
+        if diagnosis is None:
+            return None
+        responses = {"DiagnosticAgent": diagnosis}
+        if "[DIAGNOSIS_COMPLETE]" not in diagnosis:
+            return responses
+
+        diagnosis = diagnosis.replace("[DIAGNOSIS_COMPLETE]", "").strip()
+        turns.append(("diagnostic", message_text("DiagnosticAgent:", diagnosis)))
+        prompt = build_agent_prompt(
+            "RecommendationAgent", "\n".join(transcript_line(*turn) for turn in turns)
+        )
+        recommendation = collect(
+            agents["RecommendationAgent"].generate_response(prompt, "recommendation"), cancelled
+        )
+        if recommendation is None:
+            return None
+        responses["RecommendationAgent"] = recommendation
+        return responses
+
+    return speculate
+
+def schedule_prefetch(config_file: dict, prefetcher: Prefetcher) -> None:
+    """Start preparing the next turn while the patient reads the reply."""
+    state = st.session_state['prefetch']
+    turns = prefetcher.transcript(state, st.session_state.chat_session)
+    queries = patient_queries(turns)
+    speculate_after = config_file.get("prefetch", {}).get("speculate_after_turns", 3)
+    speculate = None
+    if speculate_after and len(queries) >= speculate_after:
+        speculate = speculate_diagnosis(config_file, prefetcher, state)
+    prefetcher.schedule(state, turns, queries, speculate)
+
+def get_response(
+    agent_name: str,
+    stage: str,
+    dataset: List[Dict[str, Any]],
+    agents: Dict[str, Any],
+    prefetcher: Prefetcher,
+    speculative: Dict[str, str],
+) -> str:
+    """Return the agent's speculated response, or get its response now."""
+    if agent_name in speculative:
+        return speculative[agent_name]
+    prompt = get_agent_prompt(agent_name, dataset, prefetcher)
+    return agents[agent_name].get_full_response(prompt, stage)
+
+def message_text(sender: str, content: str) -> str:
+    """Strip the sender and headings from a message before it is stored"""
+    return content.replace("###", "").replace(sender, "").strip()
+
 def display_message(sender: str, content: str):
     """Display a message with appropriate styling in Streamlit"""
-    content = content.replace("###", "").replace(sender, "").strip()
+    content = message_text(sender, content)
     
     if "User:" in sender:
-        st.session_state.chat_messages.append(("user", content))
+        st.session_state.chat_session.append("user", content)
     elif "DiagnosticAgent" in sender:
-        st.session_state.chat_messages.append(("diagnostic", content))
+        st.session_state.chat_session.append("diagnostic", content)
     elif "RecommendationAgent" in sender:
-        st.session_state.chat_messages.append(("recommendation", content))
+        st.session_state.chat_session.append("recommendation", content)
     elif "ExplanationAgent" in sender:
-        st.session_state.chat_messages.append(("explanation", content))
+        st.session_state.chat_session.append("explanation", content)
 
 @lru_cache(maxsize=100)
 def get_cached_agent_prompt(agent_name: str, conversation_key: str) -> str:
@@ -282,28 +523,47 @@ def process_agent_response(response: str, agent_name: str) -> None:
     
     display_message(f"{agent_name}:", response)
 
-def process_user_input(user_input: str, dataset: List[Dict[str, Any]], agents: Dict[str, Any]) -> None:
+def process_user_input(
+    user_input: str,
+    dataset: List[Dict[str, Any]],
+    agents: Dict[str, Any],
+    prefetcher: Prefetcher,
+    config_file: dict,
+) -> None:
     """Process user input with improved error handling and timeouts."""
     if not user_input or user_input == st.session_state.get('last_input'):
         return
 
     st.session_state['is_processing'] = True
     st.session_state['last_input'] = user_input
+    # Sessions that already have turns are admitted ahead of new ones
+    level = scheduler.IN_PROGRESS if len(st.session_state.chat_session) else scheduler.NEW_SESSION
     
     try:
-        with st.spinner('Processing...'):
+        with st.spinner('Processing...'), scheduler.priority(level):
+            state = st.session_state['prefetch']
+            speculative: Dict[str, str] = {}
+            if st.session_state['force_diagnosis']:
+                turns = prefetcher.transcript(state, st.session_state.chat_session)
+                speculative = prefetcher.take_speculation(state, turns) or {}
+            else:
+                # The patient answered instead of asking for the diagnosis
+                prefetcher.discard(state)
             display_message("User:", user_input)
             
             if st.session_state['conversation_stage'] == 'diagnostic':
-                agent = agents["DiagnosticAgent"]
-                prompt = get_agent_prompt("DiagnosticAgent", dataset)
-                
                 # Add strict timeout for API calls
                 start_time = time.time()
                 try:
                     with st.spinner('Getting diagnostic response...'):
-                        response = agent.get_full_response(prompt)
-                        if time.time() - start_time > 30:  # 30 seconds timeout
+                        stage = "diagnosis" if st.session_state['force_diagnosis'] else "follow_up"
+                        response = get_response(
+                            "DiagnosticAgent", stage, dataset, agents, prefetcher, speculative
+                        )
+                        response_timeout = config_file.get(
+                            "response_timeout", config.DEFAULT_RESPONSE_TIMEOUT
+                        )
+                        if time.time() - start_time > response_timeout:
                             raise TimeoutError("Response took too long")
                 except Exception as e:
                     st.error("API call failed. Please try again.")
@@ -316,13 +576,20 @@ def process_user_input(user_input: str, dataset: List[Dict[str, Any]], agents: D
                     for next_agent in ["RecommendationAgent", "ExplanationAgent"]:
                         try:
                             with st.spinner(f'Getting {next_agent} response...'):
-                                agent = agents[next_agent]
-                                prompt = get_agent_prompt(next_agent, dataset)
-                                response = agent.get_full_response(prompt)
+                                stage = next_agent.replace("Agent", "").lower()
+                                response = get_response(
+                                    next_agent, stage, dataset, agents, prefetcher, speculative
+                                )
                                 process_agent_response(response, next_agent)
                         except Exception as e:
                             st.error(f"{next_agent} API call failed. Please try again.")
                             return
+                    print(prefetcher.stats.report())
+                    admission = openai_client.get_client().scheduler
+                    if admission is not None:
+                        print(admission.report())
+                else:
+                    schedule_prefetch(config_file, prefetcher)
                     
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
@@ -330,32 +597,37 @@ def process_user_input(user_input: str, dataset: List[Dict[str, Any]], agents: D
         st.session_state['is_processing'] = False
         st.session_state['force_diagnosis'] = False
 
-def render_conversation_ui(dataset: List[Dict[str, Any]], agents: Dict[str, Any]):
+def render_message(message: Message) -> None:
+    """Render a message from its pre-built display block."""
+    block = message.block
+    if block.title is None:
+        getattr(st, block.style)(block.body)
+    else:
+        with getattr(st, block.style)(block.title):
+            st.markdown(block.body)
+
+def render_conversation_ui(
+    dataset: List[Dict[str, Any]],
+    agents: Dict[str, Any],
+    prefetcher: Prefetcher,
+    config_file: dict,
+):
     """Render the conversation UI with improved layout."""
     st.write("### Diagnostic Session")
     
-    # Display conversation history with enhanced formatting
-    for msg_type, content in st.session_state.chat_messages:
-        if msg_type == "user":
-            st.info(f"👤 Patient: {content}")
-        elif msg_type == "diagnostic":
-            with st.success("🔍 Diagnostic Assessment"):
-                st.write(content)
-                if "[DIAGNOSIS_COMPLETE]" in content:
-                    st.write("---")
-                    st.write("*Diagnosis phase complete*")
-        elif msg_type == "recommendation":
-            with st.warning("💊 Treatment Recommendations"):
-                recommendations = [r.strip() for r in content.split('.') if r.strip()]
-                for rec in recommendations:
-                    if rec and not rec.endswith('[RECOMMENDATIONS_COMPLETE]'):
-                        st.write(f"• {rec}")
-                if "[RECOMMENDATIONS_COMPLETE]" in content:
-                    st.write("---")
-                    st.write("*Recommendations phase complete*")
-        elif msg_type == "explanation":
-            with st.info("📝 Medical Explanation"):
-                st.markdown(content.replace("[EXPLANATION_COMPLETE]", "\n\n*Explanation phase complete*"))
+    # Display the recent window of the conversation; older turns stay on disk
+    # until the patient asks for them
+    chat_session = st.session_state.chat_session
+    recent = chat_session.recent()
+    if len(chat_session) > len(recent):
+        if st.session_state['show_earlier']:
+            for message in chat_session.earlier():
+                render_message(message)
+        elif st.button(f"Show {len(chat_session) - len(recent)} earlier messages"):
+            st.session_state['show_earlier'] = True
+            st.rerun()
+    for message in recent:
+        render_message(message)
 
     # Show input field and buttons during diagnostic stage
     if st.session_state['conversation_stage'] == 'diagnostic':
@@ -386,24 +658,24 @@ def render_conversation_ui(dataset: List[Dict[str, Any]], agents: Dict[str, Any]
                 "Complete Diagnosis",
                 key="complete_button",
                 type="primary",
-                disabled=st.session_state['is_processing'] or not st.session_state.chat_messages,
+                disabled=st.session_state['is_processing'] or not len(st.session_state.chat_session),
                 use_container_width=True
             )
 
         if send_button and user_input:
-            process_user_input(user_input, dataset, agents)
+            process_user_input(user_input, dataset, agents, prefetcher, config_file)
             st.rerun()
         
         if complete_button:
             st.session_state['force_diagnosis'] = True
-            process_user_input("Please provide the diagnosis now.", dataset, agents)
+            process_user_input(DIAGNOSIS_REQUEST, dataset, agents, prefetcher, config_file)
             st.rerun()
 
     # Show completion message and reset button
     elif st.session_state['conversation_stage'] == 'complete':
         st.success("### Diagnostic Session Complete!")
         if st.button("Start New Conversation", type="primary", use_container_width=True):
-            reset_session()
+            reset_session(prefetcher)
             st.rerun()
 
 def main() -> None:
@@ -413,18 +685,34 @@ def main() -> None:
     if not api_key or api_key.startswith("sk-..."):
         st.error("Error: Please set a valid OPENAI_API_KEY in your .env file")
         st.stop()
-    
-    openai.api_key = api_key
 
-    # Load configuration and dataset
-    config_file = fetch_validated_config("agent.json")
-    agent_order = config_file["agent_order"]
-    agents = config.create_coloragents(config_file)
-    dataset = load_dataset(config_file["dataset"])
+    # Load configuration and dataset, from the prebuilt snapshot when it's current
+    with startup.step("snapshot"):
+        startup_snapshot = load_startup_snapshot("agent.json")
+    with startup.step("config"):
+        if startup_snapshot is not None:
+            config_file = startup_snapshot.config
+        else:
+            config_file = fetch_validated_config("agent.json")
+        configure_openai_client(
+            {"api_key": api_key, **config_file.get("openai_client", {})},
+            config_file.get("rate_limits", {}),
+        )
+        configure_route_recorder(config_file.get("route_log", ""))
+        agent_order = config_file["agent_order"]
+        agents = config.create_coloragents(config_file)
+    with startup.step("dataset"):
+        if startup_snapshot is not None:
+            dataset = startup_snapshot.dataset
+        else:
+            dataset = load_dataset(config_file["dataset"])
 
-    # Initialize knowledge base (simplified)
-    kb = KnowledgeBase()
-    kb.load_dataset(dataset)
+    # Initialize knowledge base (shared across reruns and sessions)
+    with startup.step("knowledge base"):
+        kb = create_knowledge_base(config_file, dataset, startup_snapshot)
+        prefetcher = create_prefetcher(
+            kb, config_file.get("prefetch", {}), config_file.get("embedding_threshold", 0.7)
+        )
     
     # Replace the old dataset-based functions with knowledge base calls
     def get_relevant_questions(symptom: str, dataset: List[Dict[str, Any]]) -> List[str]:
@@ -437,7 +725,13 @@ def main() -> None:
     terminal_output = io.StringIO()
 
     # Initialize session state
-    initialize_session_state()
+    store = create_session_store(
+        config_file.get("session_db", "sessions.db"),
+        config_file.get("session_window", 20),
+        config_file.get("session_ttl", 7 * 24 * 3600),
+    )
+    initialize_session_state(store)
+    startup.report()
     
     if 'terminal_history' not in st.session_state:
         st.session_state['terminal_history'] = ""
@@ -463,7 +757,7 @@ def main() -> None:
         st.stop()
     
     # Render the main conversation interface
-    render_conversation_ui(dataset, agents)
+    render_conversation_ui(dataset, agents, prefetcher, config_file)
     
     # # Add reset button at the bottom
     # st.write("---")
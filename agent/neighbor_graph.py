@@ -0,0 +1,111 @@
+"""
+This module provides the k-nearest-neighbor graph between symptom
+embeddings, used to expand retrieval results to related symptoms.
+
+The graph is built with a blocked matrix multiply: rows and columns are
+scored a block at a time and only the running top k per row is kept, so
+memory stays O(block_size * (block_size + k)) however large the dataset.
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 1024
+
+
+class NeighborGraph:
+    """
+    The `k` most similar other rows of every row, best first.
+    """
+
+    def __init__(
+        self, indices: np.ndarray, similarities: np.ndarray, k: int, source: str = ""
+    ) -> None:
+        """
+        Initialize the NeighborGraph.
+
+        Parameters:
+            indices (np.ndarray): Neighbor rows, shape (rows, min(k, rows - 1)).
+            similarities (np.ndarray): Cosine similarity of each neighbor.
+            k (int): Neighbors requested per row.
+            source (str): Fingerprint of the rows the graph was built from.
+        """
+        self.indices = indices
+        self.similarities = similarities
+        self.k = k
+        self.source = source
+
+    @classmethod
+    def build(
+        cls, matrix: np.ndarray, k: int, source: str = "", block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> "NeighborGraph":
+        """
+        Build the graph over unit-length rows.
+
+        A row is never its own neighbor. Rows with fewer than `k` other rows
+        get all of them.
+        """
+        rows = len(matrix)
+        width = max(0, min(k, rows - 1))
+        indices = np.zeros((rows, width), dtype=np.int32)
+        similarities = np.zeros((rows, width), dtype=np.float32)
+        if width == 0:
+            return cls(indices, similarities, k, source)
+
+        for start in range(0, rows, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            own = np.arange(len(block))
+            best_idx = np.zeros((len(block), 0), dtype=np.int64)
+            best_sim = np.zeros((len(block), 0), dtype=np.float32)
+            for col in range(0, rows, block_size):
+                scores = block @ np.asarray(matrix[col:col + block_size], dtype=np.float32).T
+                # Exclude each row's similarity to itself
+                self_cols = start + own - col
+                inside = (self_cols >= 0) & (self_cols < scores.shape[1])
+                scores[own[inside], self_cols[inside]] = -np.inf
+
+                cand_sim = np.hstack([best_sim, scores])
+                cand_idx = np.hstack(
+                    [best_idx, np.broadcast_to(np.arange(col, col + scores.shape[1]), scores.shape)]
+                )
+                if cand_sim.shape[1] > width:
+                    keep = np.argpartition(-cand_sim, width - 1, axis=1)[:, :width]
+                    cand_sim = np.take_along_axis(cand_sim, keep, axis=1)
+                    cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+                best_sim, best_idx = cand_sim, cand_idx
+
+            order = np.argsort(-best_sim, axis=1, kind="stable")
+            similarities[start:start + len(block)] = np.take_along_axis(best_sim, order, axis=1)
+            indices[start:start + len(block)] = np.take_along_axis(best_idx, order, axis=1)
+        return cls(indices, similarities, k, source)
+
+    def neighbors(self, row: int) -> List[Tuple[int, float]]:
+        """Return (row, similarity) pairs of a row's neighbors, best first."""
+        return [
+            (int(idx), float(similarity))
+            for idx, similarity in zip(self.indices[row], self.similarities[row])
+        ]
+
+    def save(self, file_path: str) -> None:
+        """Persist the graph to an .npz file."""
+        np.savez(
+            file_path,
+            indices=self.indices,
+            similarities=self.similarities,
+            k=self.k,
+            source=self.source,
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional["NeighborGraph"]:
+        """Load a graph saved with `save`, or None if the file doesn't exist."""
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as data:
+            return cls(
+                data["indices"],
+                data["similarities"],
+                int(data["k"]),
+                str(data["source"]),
+            )
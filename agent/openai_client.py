@@ -0,0 +1,264 @@
+"""
+This module provides the shared client layer for OpenAI API calls.
+
+All agents and the knowledge base go through one OpenAIClient, which gives them
+a pooled keep-alive HTTP session, bounded retries with jittered exponential
+backoff, a process-wide retry budget and per-endpoint concurrency caps.
+Pointing `api_base` at a local server makes the whole layer testable offline.
+"""
+import functools
+import random
+import threading
+import time
+import typing
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scheduler import AdmissionScheduler, estimate_tokens
+from startup import lazy_import
+
+# Loaded on the first API call instead of at startup
+openai = lazy_import("openai")
+
+DEFAULT_CONCURRENCY = {"chat": 16, "embeddings": 4}
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    """Errors after which repeating the call may succeed."""
+    return (
+        openai.error.RateLimitError,
+        openai.error.APIConnectionError,
+        openai.error.Timeout,
+        openai.error.ServiceUnavailableError,
+        openai.error.TryAgain,
+    )
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the requests made, so a failing upstream
+    sees at most (1 + ratio) times the normal load instead of a retry storm.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: int = 10) -> None:
+        """
+        Initialize the RetryBudget.
+
+        Parameters:
+            ratio (float): Retries earned per request.
+            burst (int): Most retries that can be saved up, and the starting balance.
+        """
+        self._ratio = ratio
+        self._burst = float(burst)
+        self._balance = float(burst)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """Record a request."""
+        with self._lock:
+            self._balance = min(self._balance + self._ratio, self._burst)
+
+    def withdraw(self) -> bool:
+        """Spend one retry, returning False if the budget is exhausted."""
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+def is_retryable(err: Exception) -> bool:
+    """Whether a failed call may succeed if it is repeated."""
+    if isinstance(err, retryable_errors()):
+        return True
+    if isinstance(err, openai.error.APIError):
+        return err.http_status is None or err.http_status >= 500
+    return False
+
+
+def retry_after(err: Exception) -> float:
+    """Seconds the server asked us to wait, or 0."""
+    headers = getattr(err, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class OpenAIClient:
+    """
+    Wraps the OpenAI API with connection pooling, retries and concurrency caps.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 32,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        retry_budget_ratio: float = 0.1,
+        retry_budget_burst: int = 10,
+        max_concurrency: Optional[Dict[str, int]] = None,
+        request_timeout: Optional[float] = None,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+        scheduler: Optional[AdmissionScheduler] = None,
+    ) -> None:
+        """
+        Initialize the OpenAIClient.
+
+        Parameters:
+            pool_size (int): Keep-alive connections kept open to the API host.
+            max_retries (int): Retries per call after the first attempt.
+            backoff_base (float): Backoff before the first retry, doubled per attempt.
+            backoff_max (float): Upper bound of the backoff in seconds.
+            retry_budget_ratio (float): Retries earned per request across the process.
+            retry_budget_burst (int): Most retries the budget can save up.
+            max_concurrency (dict[str, int]): In-flight calls allowed per endpoint
+                ("chat", "embeddings").
+            request_timeout (float): Per-request timeout in seconds.
+            api_base (str): Override of the API URL, e.g. a local fake server.
+            api_key (str): Override of the API key.
+            scheduler (AdmissionScheduler): Rate limiter every attempt waits on.
+        """
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._request_timeout = request_timeout
+        self._api_base = api_base
+        self._api_key = api_key
+        self.scheduler = scheduler
+        self._budget = RetryBudget(retry_budget_ratio, retry_budget_burst)
+        concurrency = {**DEFAULT_CONCURRENCY, **(max_concurrency or {})}
+        self._semaphores = {
+            endpoint: threading.BoundedSemaphore(limit)
+            for endpoint, limit in concurrency.items()
+        }
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Connection"] = "keep-alive"
+
+    def _request_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the client-wide request settings to a call's arguments."""
+        if self._request_timeout is not None:
+            kwargs.setdefault("request_timeout", self._request_timeout)
+        if self._api_base is not None:
+            kwargs.setdefault("api_base", self._api_base)
+        if self._api_key is not None:
+            kwargs.setdefault("api_key", self._api_key)
+        return kwargs
+
+    def _backoff(self, attempt: int, err: Exception) -> float:
+        """Full-jitter exponential backoff, honoring Retry-After."""
+        ceiling = min(self._backoff_max, self._backoff_base * 2 ** attempt)
+        return max(random.uniform(0, ceiling), retry_after(err))
+
+    def _call(
+        self,
+        endpoint: str,
+        create: Callable[..., Any],
+        max_retries: Optional[int] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Call an OpenAI resource's create method with retries.
+
+        Every attempt is first admitted by the scheduler, in priority order,
+        and only then takes one of the endpoint's concurrency slots. The slot
+        is released during backoff. A stream keeps its slot until it is
+        exhausted or closed.
+
+        `max_retries` overrides the client's setting for this call, e.g. 0 when
+        the caller has a fallback of its own.
+        """
+        semaphore = self._semaphores[endpoint]
+        max_retries = self._max_retries if max_retries is None else max_retries
+        # openai 0.27 sends requests through a per-thread session it creates
+        # itself; put the pooled one there for the calling thread
+        openai.api_requestor._thread_context.session = self.session
+        kwargs = self._request_kwargs(kwargs)
+        tokens = estimate_tokens(kwargs)
+        self._budget.deposit()
+        attempt = 0
+        while True:
+            if self.scheduler is not None:
+                self.scheduler.acquire(tokens)
+            semaphore.acquire()
+            try:
+                result = create(**kwargs)
+            except BaseException as err:
+                semaphore.release()
+                if (
+                    not isinstance(err, Exception)
+                    or not is_retryable(err)
+                    or attempt >= max_retries
+                    or not self._budget.withdraw()
+                ):
+                    raise
+                time.sleep(self._backoff(attempt, err))
+                attempt += 1
+                continue
+            if kwargs.get("stream"):
+                return self._hold_while_streaming(result, semaphore)
+            semaphore.release()
+            return result
+
+    def chat_completion(self, **kwargs) -> Any:
+        """
+        Create a chat completion.
+
+        Only opening a stream is retried; an error in the middle of a stream
+        is raised to the caller.
+        """
+        return self._call("chat", openai.ChatCompletion.create, **kwargs)
+
+    @staticmethod
+    def _hold_while_streaming(
+        stream: typing.Iterator[Any], semaphore: threading.BoundedSemaphore
+    ) -> typing.Iterator[Any]:
+        try:
+            yield from stream
+        finally:
+            semaphore.release()
+
+    def embedding(self, **kwargs) -> Any:
+        """Create embeddings."""
+        return self._call("embeddings", openai.Embedding.create, **kwargs)
+
+
+_default_client: Optional[OpenAIClient] = None
+_default_lock = threading.Lock()
+
+
+def configure(rate_limits: Optional[Dict[str, Any]] = None, **settings) -> OpenAIClient:
+    """
+    Replace the shared client with one built from the given settings.
+
+    Parameters:
+        rate_limits (dict[str, Any]): Keyword arguments for an AdmissionScheduler
+            shared by all calls; no rate limiting when None.
+        **settings: Keyword arguments for OpenAIClient.
+
+    Returns:
+        OpenAIClient: The new shared client.
+    """
+    global _default_client
+    with _default_lock:
+        scheduler = AdmissionScheduler(**rate_limits) if rate_limits else None
+        _default_client = OpenAIClient(scheduler=scheduler, **settings)
+        return _default_client
+
+
+def get_client() -> OpenAIClient:
+    """Return the shared client, creating one with default settings if needed."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = OpenAIClient()
+        return _default_client
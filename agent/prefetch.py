@@ -0,0 +1,366 @@
+"""
+This module prefetches the work of a patient's next turn while they type.
+
+After each agent reply, a background task warms knowledge base retrieval for
+the patient's messages and pre-renders the transcript the next prompt starts
+with. Once the patient has answered enough questions that they are likely to
+ask for the diagnosis, it also runs the diagnosis and the recommendation
+speculatively.
+
+Prefetched work is keyed by the conversation it was computed from. When the
+conversation diverges the work is discarded, and a speculation that is still
+streaming is cancelled.
+"""
+import contextvars
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import scheduler
+from knowledge_base import KnowledgeBase
+from session_store import Session
+
+PREFETCH_KINDS = ("prompt", "retrieval", "speculation")
+
+# A conversation message as (kind, content)
+Turn = Tuple[str, str]
+# Computes speculative responses, keyed by agent name, for a transcript; returns
+# None once the event is set
+Speculate = Callable[[List[Turn], threading.Event], Optional[Dict[str, str]]]
+
+
+def transcript_line(kind: str, content: str) -> str:
+    """Format a message as a line of the transcript given to the agents."""
+    return f"{'Patient' if kind == 'user' else kind.capitalize()}: {content}"
+
+
+def conversation_key(turns: Sequence[Turn]) -> str:
+    """Identify a conversation by its messages."""
+    digest = hashlib.sha1()
+    for kind, content in turns:
+        digest.update(f"{kind}\0{content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def collect(stream: Iterator[str], cancelled: threading.Event) -> Optional[str]:
+    """Join a streamed response, or close the stream and return None once cancelled."""
+    parts = []
+    for chunk in stream:
+        if cancelled.is_set():
+            stream.close()  # type: ignore
+            return None
+        parts.append(chunk)
+    return "".join(parts)
+
+
+class PrefetchStats:
+    """
+    Counts how often prefetched work is used, per kind of work.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts = {kind: {"hits": 0, "misses": 0} for kind in PREFETCH_KINDS}
+        self._discarded = 0
+
+    def record(self, kind: str, hit: bool) -> None:
+        """Count a lookup of prefetched work."""
+        with self._lock:
+            self._counts[kind]["hits" if hit else "misses"] += 1
+
+    def discard(self) -> None:
+        """Count a speculation thrown away because the conversation diverged."""
+        with self._lock:
+            self._discarded += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the lookups.
+
+        Returns:
+            dict[str, Any]: Hits, misses and hit rate (None before any lookup)
+            per kind, and the number of discarded speculations under "discarded".
+        """
+        with self._lock:
+            summary: Dict[str, Any] = {}
+            for kind, counts in self._counts.items():
+                total = counts["hits"] + counts["misses"]
+                summary[kind] = {**counts, "hit_rate": counts["hits"] / total if total else None}
+            summary["discarded"] = self._discarded
+        return summary
+
+    def report(self) -> str:
+        """Format the hit rates as one line."""
+        summary = self.summary()
+        parts = []
+        for kind in PREFETCH_KINDS:
+            counts = summary[kind]
+            total = counts["hits"] + counts["misses"]
+            rate = f"{counts['hit_rate']:.0%}" if total else "-"
+            parts.append(f"{kind} {rate} ({counts['hits']}/{total})")
+        return f"Prefetch hit rates: {', '.join(parts)}; {summary['discarded']} discarded"
+
+
+class _Speculation:
+    __slots__ = ("key", "future", "cancelled", "priority")
+
+    def __init__(
+        self,
+        key: str,
+        future: Future,
+        cancelled: threading.Event,
+        priority: scheduler.PriorityLevel,
+    ) -> None:
+        self.key = key
+        self.future = future
+        self.cancelled = cancelled
+        self.priority = priority
+
+
+class PrefetchState:
+    """
+    The prefetched work of one conversation. Keep one per session.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._turns: List[Turn] = []
+        # Rendered transcript of the first `_context_turns` turns
+        self._context = ""
+        self._context_turns = 0
+        # query -> (knowledge base version, entries)
+        self._retrieval: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        self._speculation: Optional[_Speculation] = None
+        self._speculations = 0
+
+
+class Prefetcher:
+    """
+    Runs prefetch work on a small thread pool shared by all sessions.
+    """
+
+    def __init__(
+        self,
+        kb: Optional[KnowledgeBase] = None,
+        max_workers: int = 2,
+        threshold: float = 0.7,
+        max_speculations: int = 2,
+    ) -> None:
+        """
+        Initialize the Prefetcher.
+
+        Parameters:
+            kb (KnowledgeBase): Knowledge base to warm retrieval for, if any.
+            max_workers (int): Threads running prefetch work.
+            threshold (float): Similarity threshold of the retrieval.
+            max_speculations (int): Speculations started per conversation.
+        """
+        self.stats = PrefetchStats()
+        self._kb = kb
+        self._threshold = threshold
+        self._max_speculations = max_speculations
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="prefetch")
+        # Lookups get their own threads so they never queue behind speculation
+        self._retrieval_executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="prefetch-retrieval"
+        )
+
+    def transcript(self, state: PrefetchState, session: Session) -> List[Turn]:
+        """
+        Return the session's messages, reusing the turns kept by the last
+        `schedule` and reading only newer messages from the in-memory window.
+        The whole history is read if the window doesn't reach back far enough.
+        """
+        recent = session.recent()
+        with state._lock:
+            turns = state._turns
+        start = recent[0].seq if recent else len(session)
+        if start <= len(turns) <= len(session):
+            return turns + [(m.kind, m.content) for m in recent if m.seq >= len(turns)]
+        return [(message.kind, message.content) for message in session.history()]
+
+    def context(self, state: PrefetchState, turns: List[Turn]) -> str:
+        """
+        Render the transcript for a prompt, starting from the transcript
+        pre-rendered in the background when it is a prefix of `turns`.
+        """
+        with state._lock:
+            context, count, prefetched = state._context, state._context_turns, state._turns
+        hit = 0 < count <= len(turns) and prefetched[:count] == turns[:count]
+        if count:
+            self.stats.record("prompt", hit)
+        lines = [context] if hit else []
+        lines.extend(transcript_line(*turn) for turn in turns[count if hit else 0:])
+        return "\n".join(lines)
+
+    def relevant_entries(
+        self,
+        state: PrefetchState,
+        queries: List[str],
+        record: bool = True,
+        timeout: Optional[float] = None,
+        prefetched_only: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Get the knowledge base entries relevant to each query, followed by
+        their neighbors in the symptom graph, reusing results prefetched for
+        the current knowledge base version.
+
+        With `prefetched_only`, queries that weren't prefetched get no entries
+        and nothing is embedded, so a patient's turn never waits on retrieval.
+        Otherwise they are looked up for at most `timeout` seconds (no limit
+        when None). A lookup that takes longer keeps running and is kept for
+        the next turn. Until then, and if the lookup fails, those queries get
+        no entries, so retrieval never fails a turn.
+        """
+        if self._kb is None or not queries:
+            return [[] for _ in queries]
+        cached, missing = self._cached_entries(state, queries)
+        if missing and not prefetched_only:
+            # Run at the caller's priority
+            lookup = self._retrieval_executor.submit(
+                contextvars.copy_context().run, self._look_up, state, missing
+            )
+            try:
+                cached.update(lookup.result(timeout))
+            except FutureTimeoutError:
+                pass
+            except Exception as err:
+                print(f"Retrieval failed: {err}")
+        if record:
+            for query in queries:
+                self.stats.record("retrieval", query not in missing)
+        return [cached.get(query, []) for query in queries]
+
+    def schedule(
+        self,
+        state: PrefetchState,
+        turns: List[Turn],
+        queries: List[str],
+        speculate: Optional[Speculate] = None,
+    ) -> None:
+        """
+        Start prefetching for the next turn after an agent reply.
+
+        Parameters:
+            state (PrefetchState): The session's prefetch state.
+            turns (list[Turn]): The conversation so far.
+            queries (list[str]): Retrieval queries to warm.
+            speculate (Speculate): Computes responses speculatively, if the
+                conversation is likely to end with the next turn. Ignored once
+                the conversation has started `max_speculations`.
+        """
+        self.discard(state)
+        with state._lock:
+            state._turns = turns
+            if speculate is not None and state._speculations >= self._max_speculations:
+                speculate = None
+        self._executor.submit(self._prefetch, state, turns, queries)
+        if speculate is not None:
+            cancelled = threading.Event()
+            # Batch until a patient waits for it; see take_speculation
+            priority = scheduler.PriorityLevel(scheduler.BATCH)
+            future = self._executor.submit(self._speculate, speculate, turns, cancelled, priority)
+            with state._lock:
+                state._speculations += 1
+                state._speculation = _Speculation(
+                    conversation_key(turns), future, cancelled, priority
+                )
+
+    def take_speculation(self, state: PrefetchState, turns: List[Turn]) -> Optional[Dict[str, str]]:
+        """
+        Return the responses speculated for this conversation, waiting for them
+        if they are being computed, or None. Speculation that hasn't started
+        yet is cancelled rather than waited for; running speculation is raised
+        to the caller's priority so the patient doesn't wait behind other calls.
+        """
+        with state._lock:
+            speculation, state._speculation = state._speculation, None
+        if speculation is None:
+            self.stats.record("speculation", False)
+            return None
+        if speculation.key != conversation_key(turns) or speculation.future.cancel():
+            speculation.cancelled.set()
+            self.stats.discard()
+            self.stats.record("speculation", False)
+            return None
+        speculation.priority.raise_to(scheduler.current_priority())
+        result = speculation.future.result()
+        self.stats.record("speculation", result is not None)
+        return result
+
+    def discard(self, state: PrefetchState) -> None:
+        """Cancel the session's speculation, e.g. when the patient sends another message."""
+        with state._lock:
+            speculation, state._speculation = state._speculation, None
+        if speculation is not None:
+            speculation.future.cancel()
+            speculation.cancelled.set()
+            self.stats.discard()
+
+    def reset(self, state: PrefetchState) -> None:
+        """Drop everything prefetched for a conversation that starts over."""
+        self.discard(state)
+        with state._lock:
+            state._turns = []
+            state._context, state._context_turns = "", 0
+            state._retrieval.clear()
+            state._speculations = 0
+
+    def _cached_entries(
+        self, state: PrefetchState, queries: List[str]
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+        """Split queries into those with entries for the current version and the rest."""
+        version = self._kb.version
+        with state._lock:
+            cached = {
+                query: state._retrieval[query][1]
+                for query in queries
+                if state._retrieval.get(query, (None,))[0] == version
+            }
+        return cached, [query for query in dict.fromkeys(queries) if query not in cached]
+
+    def _look_up(self, state: PrefetchState, queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Search the knowledge base and keep the results for later turns."""
+        version = self._kb.version
+        results = dict(zip(
+            queries, self._kb.get_relevant_entries_batch(queries, self._threshold, expand=True)
+        ))
+        with state._lock:
+            for query, entries in results.items():
+                state._retrieval[query] = (version, entries)
+        return results
+
+    def _prefetch(self, state: PrefetchState, turns: List[Turn], queries: List[str]) -> None:
+        context = "\n".join(transcript_line(*turn) for turn in turns)
+        with state._lock:
+            if state._turns is turns:
+                state._context, state._context_turns = context, len(turns)
+        if self._kb is None:
+            return
+        try:
+            # Prefetching must not delay the calls of patients who are waiting
+            with scheduler.priority(scheduler.BATCH):
+                _, missing = self._cached_entries(state, queries)
+                if missing:
+                    self._look_up(state, missing)
+        except Exception as err:
+            print(f"Retrieval prefetch failed: {err}")
+
+    def _speculate(
+        self,
+        speculate: Speculate,
+        turns: List[Turn],
+        cancelled: threading.Event,
+        priority: scheduler.PriorityLevel,
+    ) -> Optional[Dict[str, str]]:
+        if cancelled.is_set():
+            return None
+        try:
+            with scheduler.priority(priority):
+                return speculate(turns, cancelled)
+        except Exception as err:
+            print(f"Speculative response failed: {err}")
+            return None
@@ -1,6 +1,5 @@
 """
-This module contains the ColorPrinter class, which is a callable object that
-prints text in a specified color.
+This module contains the console colors agents can be configured with.
 """
 import colorama
 
@@ -25,16 +24,3 @@ COLORS = {
     "LIGHTCYAN_EX": colorama.Fore.LIGHTCYAN_EX,
     "LIGHTWHITE_EX": colorama.Fore.LIGHTWHITE_EX,
 }
-
-
-class ColorPrinter:
-    def __init__(
-        self,
-        color: str,
-    ) -> None:
-        self.color = COLORS[color]
-
-    def __call__(self, *args, **kwargs) -> None:
-        print(f"{self.color}", end="")
-        print(*args, **kwargs)
-        print(f"{colorama.Style.RESET_ALL}", end="", flush=True)
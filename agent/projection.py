@@ -0,0 +1,123 @@
+"""
+This module provides linear projections (PCA and random projection) that
+reduce symptom embeddings to a lower dimension before similarity search.
+"""
+import hashlib
+import os
+from typing import List, Optional
+
+import numpy as np
+
+PROJECTION_METHODS = ("pca", "random")
+
+
+def fingerprint(texts: List[str]) -> str:
+    """Return a stable hash of the texts a projection was fitted on."""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Projection:
+    """
+    A fitted linear map from full-dimension embeddings to `dim` dimensions.
+
+    "pca" is fitted without centering the data (a truncated SVD), so cosine
+    similarities keep the scale of the full-dimension embeddings. Centering
+    would shift every similarity down, since OpenAI embeddings share a large
+    common direction that the mean removes. Dot products of projected unit
+    vectors are then the cosine of their parts inside the fitted subspace, so
+    vectors must be scaled to unit length before they are projected, not
+    after; see KnowledgeBase._search_vectors.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        mean: np.ndarray,
+        components: np.ndarray,
+        source: str = "",
+        requested_dim: Optional[int] = None,
+    ) -> None:
+        """
+        Initialize the Projection.
+
+        Parameters:
+            method (str): Either "pca" or "random".
+            mean (np.ndarray): Vector subtracted before projecting.
+            components (np.ndarray): Matrix of shape (full_dim, dim).
+            source (str): Fingerprint of the texts the projection was fitted on.
+            requested_dim (int): Dimension the projection was fitted for, which
+                PCA may have clamped; None if unknown.
+        """
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"Invalid projection method: {method}")
+        self.method = method
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.source = source
+        self.requested_dim = requested_dim
+
+    @property
+    def dim(self) -> int:
+        """Number of output dimensions."""
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(
+        cls, embeddings: np.ndarray, dim: int, method: str = "pca", source: str = "", seed: int = 0
+    ) -> "Projection":
+        """
+        Fit a projection on the given embeddings.
+
+        PCA cannot produce more components than there are rows, so the output
+        dimension is clamped to the rank of the data. Random projection has no
+        such limit.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        full_dim = embeddings.shape[1]
+        if method == "pca":
+            # Uncentered, so similarities keep their scale; see the class docstring
+            mean = np.zeros(full_dim, dtype=np.float32)
+            _, _, vt = np.linalg.svd(embeddings, full_matrices=False)
+            components = vt[: min(dim, vt.shape[0])].T
+        elif method == "random":
+            mean = np.zeros(full_dim, dtype=np.float32)
+            rng = np.random.default_rng(seed)
+            components = rng.standard_normal((full_dim, dim)) / np.sqrt(dim)
+        else:
+            raise ValueError(f"Invalid projection method: {method}")
+        return cls(method, mean, components, source, dim)
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """Project a vector or a matrix of row vectors."""
+        return (np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.components
+
+    def save(self, file_path: str) -> None:
+        """Persist the projection to an .npz file."""
+        np.savez(
+            file_path,
+            method=self.method,
+            mean=self.mean,
+            components=self.components,
+            source=self.source,
+            requested_dim=-1 if self.requested_dim is None else self.requested_dim,
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional["Projection"]:
+        """Load a projection saved with `save`, or None if the file doesn't exist."""
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as data:
+            # Projections saved before the requested dimension was stored have none
+            requested_dim = int(data["requested_dim"]) if "requested_dim" in data.files else -1
+            return cls(
+                str(data["method"]),
+                data["mean"],
+                data["components"],
+                str(data["source"]),
+                requested_dim if requested_dim >= 0 else None,
+            )
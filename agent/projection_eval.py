@@ -0,0 +1,171 @@
+"""
+This module measures how a reduced-dimension symptom index compares with the
+full-dimension index, on the labeled paraphrase queries also used by
+retrieval_eval.py. Queries are never dataset rows, so no query trivially
+matches itself.
+
+For every projection dimension it reports how much of the full-dimension
+top-k the reduced index returns, recall@k of the expected symptoms, how the
+similarity threshold behaves (recall above the threshold, agreement of the
+above-threshold sets, and the largest change of a similarity) and search time.
+Query embeddings not yet in the embeddings cache are requested once.
+
+Usage:
+    python projection_eval.py agent.json --dims 8 16 29 --top-k 5 --threshold 0.7
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Set
+
+import numpy as np
+
+import config
+import scheduler
+from dataset_watcher import read_rows
+from knowledge_base import KnowledgeBase
+from projection import PROJECTION_METHODS, Projection
+from retrieval_eval import DEFAULT_QUERIES, read_queries
+
+
+def top_k_indices(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the k highest-scoring rows for each query."""
+    scores = queries @ matrix.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def agreement(full: np.ndarray, reduced: np.ndarray) -> float:
+    """Average fraction of the full-dimension top-k that the reduced index also returns."""
+    k = full.shape[1]
+    overlaps = [len(set(f) & set(r)) / k for f, r in zip(full, reduced)]
+    return float(np.mean(overlaps))
+
+
+def recall(retrieved: List[Set[int]], expected: List[Set[int]]) -> float:
+    """Average fraction of each query's expected rows that were retrieved."""
+    return float(np.mean([len(e & r) / len(e) for r, e in zip(retrieved, expected)]))
+
+
+def set_agreement(full: List[Set[int]], reduced: List[Set[int]]) -> float:
+    """Average Jaccard similarity of the rows each index returns; 1 when both are empty."""
+    return float(np.mean([len(f & r) / len(f | r) if f | r else 1.0 for f, r in zip(full, reduced)]))
+
+
+def time_search(matrix: np.ndarray, queries: np.ndarray, k: int, repeats: int = 20) -> float:
+    """Average seconds spent scoring and ranking all queries."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        top_k_indices(matrix, queries, k)
+    return (time.perf_counter() - start) / repeats
+
+
+def score(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    expected: List[Set[int]],
+    k: int,
+    threshold: float,
+) -> Dict[str, Any]:
+    """Rank and threshold the queries against unit-length rows."""
+    scores = queries @ matrix.T
+    top = top_k_indices(matrix, queries, k)
+    above = [set(np.flatnonzero(row >= threshold)) for row in scores]
+    return {
+        "scores": scores,
+        "top": top,
+        "above": above,
+        "recall": recall([set(row) for row in top], expected),
+        "threshold_recall": recall(above, expected),
+        "time": time_search(matrix, queries, k),
+    }
+
+
+def evaluate(
+    config_path: str,
+    queries_path: str,
+    dims: List[int],
+    method: str,
+    top_k: int,
+    threshold: float,
+) -> None:
+    """Print retrieval agreement, recall and search time for each projection dimension."""
+    config_file = config.read_json(config_path)
+    labeled = read_queries(queries_path)
+    kb = KnowledgeBase()
+    kb.load_dataset(read_rows(config_file["dataset"]))
+
+    rows = {key: i for i, key in enumerate(kb._index.keys)}
+    labeled = [q for q in labeled if q["expected"] & rows.keys()]
+    expected = [{rows[s] for s in q["expected"] if s in rows} for q in labeled]
+    # Offline evaluation must not delay interactive sessions sharing the limits
+    with scheduler.priority(scheduler.BATCH):
+        # Lowercased like get_relevant_entries_batch, so the cached embeddings are shared
+        query_embeddings = kb._get_embeddings([q["query"].lower() for q in labeled])
+    if query_embeddings is None:
+        raise RuntimeError("Could not get embeddings for the queries")
+
+    embeddings = np.asarray(kb.symptom_embeddings, dtype=np.float32)
+    matrix = KnowledgeBase._normalize(embeddings)
+    queries = KnowledgeBase._normalize(np.asarray(query_embeddings, dtype=np.float32))
+    k = min(top_k, matrix.shape[0])
+    full = score(matrix, queries, expected, k, threshold)
+
+    print(f"{len(queries)} queries, {matrix.shape[0]} rows, top-{k}, threshold {threshold:.2f}")
+    print(
+        f"{'dim':>6} {'agreement':>10} {'recall@k':>9} {'thr recall':>11} "
+        f"{'thr agree':>10} {'max sim err':>12} {'search ms':>10} {'speedup':>8}"
+    )
+    print(
+        f"{matrix.shape[1]:>6} {1.0:>10.3f} {full['recall']:>9.3f} "
+        f"{full['threshold_recall']:>11.3f} {1.0:>10.3f} {0.0:>12.3f} "
+        f"{full['time'] * 1000:>10.3f} {1.0:>8.2f}"
+    )
+    for dim in dims:
+        projection = Projection.fit(embeddings, dim, method)
+        reduced = score(
+            KnowledgeBase._search_vectors(embeddings, projection),
+            KnowledgeBase._search_vectors(queries, projection),
+            expected,
+            k,
+            threshold,
+        )
+        print(
+            f"{projection.dim:>6} {agreement(full['top'], reduced['top']):>10.3f} "
+            f"{reduced['recall']:>9.3f} {reduced['threshold_recall']:>11.3f} "
+            f"{set_agreement(full['above'], reduced['above']):>10.3f} "
+            f"{np.abs(reduced['scores'] - full['scores']).max():>12.3f} "
+            f"{reduced['time'] * 1000:>10.3f} {full['time'] / reduced['time']:>8.2f}"
+        )
+
+
+def parse_argument() -> argparse.Namespace:
+    """
+    Parse command line arguments for the evaluation.
+
+    Returns:
+        argparse.Namespace: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare retrieval with projected symptom embeddings to the full dimension."
+    )
+    parser.add_argument("config_file", help="Path to the JSON configuration file.")
+    parser.add_argument(
+        "-q", "--queries", default=DEFAULT_QUERIES, help="Path to the labeled query CSV file."
+    )
+    parser.add_argument(
+        "--dims", type=int, nargs="+", default=[32, 64, 128, 256],
+        help="Projection dimensions to evaluate.",
+    )
+    parser.add_argument(
+        "--method", choices=PROJECTION_METHODS, default="pca",
+        help="Projection method.",
+    )
+    parser.add_argument("--top-k", type=int, default=5, help="Number of results compared.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.7, help="Similarity threshold of the retrieval."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_argument()
+    evaluate(args.config_file, args.queries, args.dims, args.method, args.top_k, args.threshold)
@@ -0,0 +1,187 @@
+"""
+This module evaluates retrieval quality against latency for a KnowledgeBase
+backend, so every index, projection or threshold change ships with its
+accuracy cost measured.
+
+A labeled query set (symptom paraphrase -> expected symptoms) is run through
+the backend for every threshold and top-k in the sweep. It reports recall@k,
+MRR, latency percentiles and index memory.
+
+Usage:
+    python retrieval_eval.py agent.json --thresholds 0.75 0.8 0.85 --top-k 1 3 5
+    python retrieval_eval.py agent.json --backend sharded --projection-dim 128
+"""
+import argparse
+import csv
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import config
+import scheduler
+from dataset_watcher import read_rows
+from knowledge_base import KnowledgeBase
+from projection import PROJECTION_METHODS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_QUERIES = "../dataset/retrieval_eval.csv"
+
+
+def read_queries(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Read the labeled query set.
+
+    The CSV has a "query" column and an "expected_symptoms" column holding the
+    symptoms that should be retrieved, separated by semicolons.
+
+    Returns:
+        list[dict[str, Any]]: Queries with their set of expected symptoms.
+    """
+    queries = []
+    with open(file_path, mode='r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            expected = {s.strip().lower() for s in row["expected_symptoms"].split(';')}
+            queries.append({"query": row["query"], "expected": expected - {""}})
+    return queries
+
+
+def create_backend(
+    config_file: Dict[str, Any],
+    backend: str,
+    projection_dim: Optional[int],
+    projection_method: Optional[str],
+) -> KnowledgeBase:
+    """Create the knowledge base to evaluate, applying command line overrides."""
+    settings = dict(config_file)
+    if projection_dim is not None:
+        settings["embedding_projection_dim"] = projection_dim
+    if projection_method is not None:
+        settings["embedding_projection_method"] = projection_method
+    if backend == "plain":
+        settings["knowledge_base_shards"] = 0
+    elif backend == "sharded" and not settings.get("knowledge_base_shards"):
+        settings["knowledge_base_shards"] = os.cpu_count() or 1
+    return config.create_knowledge_base(settings)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return a percentile of the values, or 0 for no values."""
+    return float(np.percentile(values, fraction * 100)) if values else 0.0
+
+
+def evaluate(
+    kb: KnowledgeBase, queries: List[Dict[str, Any]], threshold: float, top_k: Optional[int]
+) -> Dict[str, float]:
+    """
+    Run every query and score the results.
+
+    Returns:
+        dict[str, float]: recall@k, MRR and latency percentiles in milliseconds.
+    """
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for labeled in queries:
+        start = time.perf_counter()
+        entries = kb.get_relevant_entries(labeled["query"], threshold, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        retrieved = [entry["symptom"].lower() for entry in entries]
+        expected = labeled["expected"]
+        recalls.append(len(expected & set(retrieved)) / len(expected))
+        rank = next((i for i, symptom in enumerate(retrieved, 1) if symptom in expected), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def run(args: argparse.Namespace) -> None:
+    """Build the backend, warm the query embeddings and print the sweep."""
+    config_file = config.read_json(args.config_file)
+    config.validate(config_file)
+    queries = read_queries(args.queries)
+    kb = create_backend(config_file, args.backend, args.projection_dim, args.projection_method)
+
+    # Offline evaluation must not delay interactive sessions sharing the limits
+    with scheduler.priority(scheduler.BATCH):
+        kb.load_dataset(read_rows(config_file["dataset"]))
+        # Embed every query up front so latencies measure search, not the API
+        kb.get_relevant_entries_batch([labeled["query"] for labeled in queries])
+
+    index_bytes = kb.symptom_embeddings.nbytes + kb._search_matrix.nbytes
+    print(
+        f"{type(kb).__name__}: {len(kb.dataset)} rows, "
+        f"search dim {kb._search_matrix.shape[1]}, {len(queries)} queries"
+    )
+    print(f"Index memory: {index_bytes / 1024:.1f} KiB")
+    print(
+        f"{'threshold':>9} {'top_k':>5} {'recall@k':>9} {'MRR':>6} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for threshold in args.thresholds:
+        for top_k in args.top_k:
+            result = evaluate(kb, queries, threshold, top_k or None)
+            print(
+                f"{threshold:>9.2f} {top_k or 'all':>5} {result['recall']:>9.3f} "
+                f"{result['mrr']:>6.3f} {result['p50']:>8.3f} {result['p95']:>8.3f} "
+                f"{result['p99']:>8.3f}"
+            )
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f"Peak process memory: {peak / 1024:.1f} MiB")
+
+    close = getattr(kb, "close", None)
+    if close is not None:
+        close()
+
+
+def parse_argument() -> argparse.Namespace:
+    """
+    Parse command line arguments for the evaluation.
+
+    Returns:
+        argparse.Namespace: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Measure retrieval quality and latency of the knowledge base."
+    )
+    parser.add_argument("config_file", help="Path to the JSON configuration file.")
+    parser.add_argument(
+        "-q", "--queries", default=DEFAULT_QUERIES, help="Path to the labeled query CSV file."
+    )
+    parser.add_argument(
+        "--backend", choices=["config", "plain", "sharded"], default="config",
+        help="Knowledge base to evaluate (default: as configured).",
+    )
+    parser.add_argument(
+        "--projection-dim", type=int,
+        help="Override the embedding projection dimension (0 disables).",
+    )
+    parser.add_argument(
+        "--projection-method", choices=PROJECTION_METHODS,
+        help="Override the projection method.",
+    )
+    parser.add_argument(
+        "--thresholds", type=float, nargs="+", default=[0.7, 0.75, 0.8, 0.85, 0.9],
+        help="Similarity thresholds to sweep.",
+    )
+    parser.add_argument(
+        "--top-k", type=int, nargs="+", default=[1, 3, 5, 0],
+        help="Result counts to sweep (0 keeps every result above the threshold).",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_argument())
@@ -0,0 +1,163 @@
+"""
+This module resolves which model an agent uses for each conversation stage and
+records the routes taken, so the routing can be tuned from real latencies.
+"""
+import functools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from startup import lazy_import
+
+openai = lazy_import("openai")
+
+
+@functools.lru_cache(maxsize=None)
+def fallback_errors() -> tuple:
+    """Errors after which the next model of a route is tried."""
+    return (
+        openai.error.RateLimitError,
+        openai.error.Timeout,
+        openai.error.APIConnectionError,
+        openai.error.ServiceUnavailableError,
+        openai.error.TryAgain,
+        # Read timeouts while waiting for the first streamed chunk
+        requests.exceptions.RequestException,
+    )
+
+
+class Route:
+    """
+    An ordered fallback chain of models for one agent stage.
+    """
+
+    def __init__(self, models: List[str], timeout: Optional[float] = None) -> None:
+        """
+        Initialize the Route.
+
+        Parameters:
+            models (list[str]): The primary model followed by its fallbacks.
+            timeout (float): Seconds to wait for a model to start responding
+                before falling back to the next one.
+        """
+        if not models:
+            raise ValueError("A route needs at least one model")
+        self.models = models
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, route_config: Any) -> "Route":
+        """Build a route from a model name, a list of models or a dict."""
+        if isinstance(route_config, str):
+            return cls([route_config])
+        if isinstance(route_config, list):
+            return cls(route_config)
+        return cls(route_config["models"], route_config.get("timeout"))
+
+
+class RouteRecorder:
+    """
+    Keeps the most recent routing decisions and their latencies.
+    """
+
+    def __init__(self, log_file: Optional[str] = None, max_records: int = 10000) -> None:
+        """
+        Initialize the RouteRecorder.
+
+        Parameters:
+            log_file (str): Optional JSON Lines file every record is appended to.
+            max_records (int): Records kept in memory for `summary`.
+        """
+        self._log_file = log_file
+        self._records: deque = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        agent: str,
+        stage: Optional[str],
+        model: str,
+        attempt: int,
+        first_token: Optional[float],
+        total: float,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Record one model call.
+
+        Parameters:
+            agent (str): Name of the agent.
+            stage (str): Conversation stage, or None for the default route.
+            model (str): The model called.
+            attempt (int): Position of the model in its route (0 is the primary).
+            first_token (float): Seconds until the first streamed content, if any.
+            total (float): Seconds until the call finished or failed.
+            error (str): Error type when the call failed.
+        """
+        entry = {
+            "time": time.time(),
+            "agent": agent,
+            "stage": stage,
+            "model": model,
+            "attempt": attempt,
+            "first_token": first_token,
+            "total": total,
+            "error": error,
+        }
+        with self._lock:
+            self._records.append(entry)
+            if self._log_file:
+                with open(self._log_file, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(entry) + "\n")
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Summarize the recorded calls per agent, stage and model.
+
+        Returns:
+            dict[str, dict[str, Any]]: Call and error counts, fallback count and
+            median / 95th percentile latencies keyed by "agent/stage/model".
+        """
+        with self._lock:
+            records = list(self._records)
+        groups: Dict[str, List[dict]] = defaultdict(list)
+        for entry in records:
+            groups[f"{entry['agent']}/{entry['stage'] or 'default'}/{entry['model']}"].append(entry)
+
+        def percentile(values: List[float], fraction: float) -> Optional[float]:
+            values = sorted(values)
+            return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+        summary = {}
+        for key, entries in groups.items():
+            first_tokens = [e["first_token"] for e in entries if e["first_token"] is not None]
+            totals = [e["total"] for e in entries if e["error"] is None]
+            summary[key] = {
+                "calls": len(entries),
+                "errors": sum(1 for e in entries if e["error"] is not None),
+                "fallbacks": sum(1 for e in entries if e["attempt"] > 0),
+                "first_token_p50": percentile(first_tokens, 0.5),
+                "first_token_p95": percentile(first_tokens, 0.95),
+                "total_p50": percentile(totals, 0.5),
+                "total_p95": percentile(totals, 0.95),
+            }
+        return summary
+
+
+_recorder = RouteRecorder()
+
+
+def configure_recorder(log_file: Optional[str] = None) -> RouteRecorder:
+    """Replace the shared recorder, optionally logging to a file."""
+    global _recorder
+    _recorder = RouteRecorder(log_file)
+    return _recorder
+
+
+def get_recorder() -> RouteRecorder:
+    """Return the shared recorder."""
+    return _recorder
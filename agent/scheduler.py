@@ -0,0 +1,285 @@
+"""
+This module provides a process-wide admission scheduler for OpenAI calls.
+
+Every call waits for capacity in a requests-per-minute and a tokens-per-minute
+bucket. Waiting calls are admitted strictly by priority, then arrival order,
+so an in-progress diagnosis is never starved by a burst of new sessions or
+batch jobs. The bucket state can be kept in a file shared by several
+processes on the same host.
+"""
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Lower values are admitted first
+IN_PROGRESS = 0
+NEW_SESSION = 1
+BATCH = 2
+PRIORITY_NAMES = {IN_PROGRESS: "in_progress", NEW_SESSION: "new_session", BATCH: "batch"}
+
+
+
+class PriorityLevel:
+    """
+    A priority that can be raised while calls using it wait for admission,
+    e.g. once a patient is waiting on work started in the background.
+    """
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+
+    def raise_to(self, level: int) -> None:
+        """Raise the priority to `level` unless it is already higher."""
+        self.level = min(self.level, level)
+
+
+Priority = Union[int, PriorityLevel]
+
+_current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "request_priority", default=NEW_SESSION
+)
+
+
+def _level(level: Priority) -> int:
+    return level.level if isinstance(level, PriorityLevel) else level
+
+
+@contextlib.contextmanager
+def priority(level: Priority) -> Iterator[None]:
+    """Run the enclosed OpenAI calls at the given priority."""
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    """The priority the calling context's OpenAI calls run at."""
+    return _level(_current_priority.get())
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """
+    Roughly estimate the tokens a call will consume, at ~4 characters per token.
+
+    Chat calls count the prompt plus `max_tokens` for the completion;
+    embedding calls count their input.
+    """
+    if "messages" in kwargs:
+        chars = sum(len(message.get("content", "")) for message in kwargs["messages"])
+        return chars // 4 + int(kwargs.get("max_tokens") or 0)
+    texts = kwargs.get("input", "")
+    if isinstance(texts, str):
+        texts = [texts]
+    return sum(len(text) for text in texts) // 4
+
+
+class RateBuckets:
+    """
+    Request and token buckets that refill continuously up to one minute's worth.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float) -> None:
+        self.capacity = {
+            "requests": float(requests_per_minute),
+            "tokens": float(tokens_per_minute),
+        }
+        self._state = {**self.capacity, "updated": time.time()}
+
+    def _refill(self, state: Dict[str, float], now: float) -> None:
+        elapsed = max(0.0, now - state["updated"])
+        for name, capacity in self.capacity.items():
+            state[name] = min(capacity, state[name] + elapsed * capacity / 60)
+        state["updated"] = now
+
+    def _try_take(self, state: Dict[str, float], amounts: Dict[str, float]) -> float:
+        """Take the amounts if all are available, else return seconds until they will be."""
+        self._refill(state, time.time())
+        wait = 0.0
+        for name, amount in amounts.items():
+            amount = min(amount, self.capacity[name])
+            if state[name] < amount:
+                wait = max(wait, (amount - state[name]) * 60 / self.capacity[name])
+        if wait == 0:
+            for name, amount in amounts.items():
+                state[name] -= min(amount, self.capacity[name])
+        return wait
+
+    def try_take(self, requests: float, tokens: float) -> float:
+        """
+        Take capacity for a call.
+
+        Returns:
+            float: 0 if the capacity was taken, otherwise the seconds to wait
+            before trying again.
+        """
+        return self._try_take(self._state, {"requests": requests, "tokens": tokens})
+
+
+class SharedRateBuckets(RateBuckets):
+    """
+    RateBuckets whose state lives in a file, so every process using the same
+    file shares one limit.
+    """
+
+    def __init__(
+        self, requests_per_minute: float, tokens_per_minute: float, state_file: str
+    ) -> None:
+        if fcntl is None:
+            raise RuntimeError("Cross-process rate limiting is not supported on this platform")
+        super().__init__(requests_per_minute, tokens_per_minute)
+        self._state_file = state_file
+
+    def try_take(self, requests: float, tokens: float) -> float:
+        with open(self._state_file, "a+", encoding="utf-8") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                content = file.read()
+                if content:
+                    state = json.loads(content)
+                else:
+                    state = {**self.capacity, "updated": time.time()}
+                wait = self._try_take(state, {"requests": requests, "tokens": tokens})
+                file.seek(0)
+                file.truncate()
+                json.dump(state, file)
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+        return wait
+
+
+class AdmissionScheduler:
+    """
+    Admits OpenAI calls by priority within request and token rate limits.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        shared_state_file: Optional[str] = None,
+        max_poll_interval: float = 0.5,
+    ) -> None:
+        """
+        Initialize the AdmissionScheduler.
+
+        Parameters:
+            requests_per_minute (float): Requests allowed per minute.
+            tokens_per_minute (float): Estimated tokens allowed per minute.
+            shared_state_file (str): File holding the bucket state, to share the
+                limits with other processes. Process-local when None.
+            max_poll_interval (float): Longest wait before rechecking shared
+                buckets, which other processes may drain or refill.
+        """
+        if shared_state_file:
+            self._buckets = SharedRateBuckets(
+                requests_per_minute, tokens_per_minute, os.path.abspath(shared_state_file)
+            )
+        else:
+            self._buckets = RateBuckets(requests_per_minute, tokens_per_minute)
+        self._max_poll_interval = max_poll_interval
+        self._condition = threading.Condition()
+        self._queue: list = []
+        self._counter = itertools.count()
+        self._admitted = {level: 0 for level in PRIORITY_NAMES}
+        self._waits: deque = deque(maxlen=1000)
+
+    def acquire(self, tokens: int, level: Optional[Priority] = None) -> float:
+        """
+        Block until the call may be sent.
+
+        Parameters:
+            tokens (int): Estimated tokens the call consumes.
+            level (Priority): Priority; defaults to the one set with `priority`.
+                A PriorityLevel raised while the call waits moves it up the
+                queue, keeping its arrival order.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        requested = _current_priority.get() if level is None else level
+        ticket = (_level(requested), next(self._counter))
+        start = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    if _level(requested) != ticket[0]:
+                        self._queue.remove(ticket)
+                        ticket = (_level(requested), ticket[1])
+                        self._queue.append(ticket)
+                        heapq.heapify(self._queue)
+                    if self._queue[0] == ticket:
+                        wait = self._buckets.try_take(1, tokens)
+                        if wait == 0:
+                            break
+                        self._condition.wait(min(wait, self._max_poll_interval))
+                    else:
+                        self._condition.wait(self._max_poll_interval)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+            waited = time.monotonic() - start
+            level = ticket[0]
+            self._admitted[level] = self._admitted.get(level, 0) + 1
+            self._waits.append((level, waited))
+        return waited
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Return queue depth and wait-time statistics.
+
+        Wait times cover the last 1000 admitted calls.
+        """
+        with self._condition:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for level, _ in self._queue:
+                name = PRIORITY_NAMES.get(level, str(level))
+                depth[name] = depth.get(name, 0) + 1
+            waits = sorted(waited for _, waited in self._waits)
+            admitted = {
+                PRIORITY_NAMES.get(level, str(level)): count
+                for level, count in self._admitted.items()
+            }
+
+        def percentile(fraction: float) -> float:
+            return waits[min(len(waits) - 1, int(fraction * len(waits)))] if waits else 0.0
+
+        return {
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "admitted": admitted,
+            "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+    def report(self) -> str:
+        """Format the metrics as one line."""
+        metrics = self.metrics()
+        depth = ", ".join(
+            f"{name} {count}" for name, count in metrics["queue_depth_by_priority"].items()
+        )
+        admitted = ", ".join(f"{name} {count}" for name, count in metrics["admitted"].items())
+        return (
+            f"Admission: {metrics['queue_depth']} queued ({depth}); admitted {admitted}; "
+            f"wait mean {metrics['wait_mean']:.2f}s, p50 {metrics['wait_p50']:.2f}s, "
+            f"p95 {metrics['wait_p95']:.2f}s, max {metrics['wait_max']:.2f}s"
+        )
@@ -0,0 +1,264 @@
+"""
+This module stores conversation messages on disk so a session's memory and
+render cost don't grow with the length of its history.
+
+Messages are appended to a shared SQLite database. Each Session keeps only a
+window of recent messages in memory, and every message carries its display
+block, built the first time it is rendered instead of on every rerun.
+
+Every page load starts a new session, so sessions idle for longer than the
+store's TTL are purged.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Iterator, List, Optional
+
+MARKERS = {
+    "diagnostic": ("[DIAGNOSIS_COMPLETE]", "*Diagnosis phase complete*"),
+    "recommendation": ("[RECOMMENDATIONS_COMPLETE]", "*Recommendations phase complete*"),
+    "explanation": ("[EXPLANATION_COMPLETE]", "*Explanation phase complete*"),
+}
+
+
+class RenderedBlock:
+    """
+    A message prepared for display: a Streamlit alert style, an optional title
+    and a markdown body.
+    """
+
+    __slots__ = ("style", "title", "body")
+
+    def __init__(self, style: str, title: Optional[str], body: str) -> None:
+        self.style = style
+        self.title = title
+        self.body = body
+
+
+def build_block(kind: str, content: str) -> RenderedBlock:
+    """Format a message for display."""
+    if kind == "user":
+        return RenderedBlock("info", None, f"👤 Patient: {content}")
+    if kind == "diagnostic":
+        marker, note = MARKERS[kind]
+        body = content
+        if marker in content:
+            body += f"\n\n---\n\n{note}"
+        return RenderedBlock("success", "🔍 Diagnostic Assessment", body)
+    if kind == "recommendation":
+        marker, note = MARKERS[kind]
+        recommendations = [r.strip() for r in content.split('.') if r.strip()]
+        lines = [f"• {rec}" for rec in recommendations if not rec.endswith(marker)]
+        if marker in content:
+            lines.append(f"\n---\n\n{note}")
+        return RenderedBlock("warning", "💊 Treatment Recommendations", "  \n".join(lines))
+    marker, note = MARKERS["explanation"]
+    return RenderedBlock("info", "📝 Medical Explanation", content.replace(marker, f"\n\n{note}"))
+
+
+class Message:
+    """
+    A compact record of one conversation message.
+    """
+
+    __slots__ = ("seq", "kind", "content", "_block")
+
+    def __init__(self, seq: int, kind: str, content: str) -> None:
+        """
+        Initialize the Message.
+
+        Parameters:
+            seq (int): Position of the message in its session.
+            kind (str): "user", "diagnostic", "recommendation" or "explanation".
+            content (str): The message text.
+        """
+        self.seq = seq
+        self.kind = kind
+        self.content = content
+        self._block: Optional[RenderedBlock] = None
+
+    @property
+    def block(self) -> RenderedBlock:
+        """The display block, built on first access."""
+        if self._block is None:
+            self._block = build_block(self.kind, self.content)
+        return self._block
+
+
+class SessionStore:
+    """
+    A SQLite database holding the messages of every session.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "sessions.db",
+        window: int = 20,
+        ttl: Optional[float] = None,
+        purge_interval: float = 60,
+    ) -> None:
+        """
+        Initialize the SessionStore.
+
+        Parameters:
+            db_path (str): Path to the SQLite database file.
+            window (int): Recent messages each session keeps in memory.
+            ttl (float): Seconds after its last message a session is deleted;
+                kept forever when None.
+            purge_interval (float): Least seconds between two purges started
+                by opening new sessions.
+        """
+        self.window = window
+        self.ttl = ttl
+        self._purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+                "kind TEXT NOT NULL, content TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, seq))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_active REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)"
+            )
+            # Sessions stored before activity was tracked expire a TTL from now
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, last_active) "
+                "SELECT DISTINCT session_id, ? FROM messages",
+                (time.time(),),
+            )
+
+    def session(self, session_id: Optional[str] = None) -> "Session":
+        """
+        Open a session, creating a new id if none is given. Opening a new
+        session purges expired ones, at most once per purge interval.
+        """
+        if session_id is None:
+            if self.ttl is not None and time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + self._purge_interval
+                self.purge()
+            session_id = uuid.uuid4().hex
+        return Session(self, session_id)
+
+    def purge(self) -> int:
+        """
+        Delete the sessions whose last message is older than the TTL.
+
+        Returns:
+            int: Number of sessions deleted.
+        """
+        if self.ttl is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id IN "
+                "(SELECT session_id FROM sessions WHERE last_active < ?)",
+                (cutoff,),
+            )
+            return self._conn.execute(
+                "DELETE FROM sessions WHERE last_active < ?", (cutoff,)
+            ).rowcount
+
+    def _append(self, session_id: str, seq: int, kind: str, content: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, seq, kind, content) VALUES (?, ?, ?, ?)",
+                (session_id, seq, kind, content),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, last_active) VALUES (?, ?)",
+                (session_id, time.time()),
+            )
+
+    def _load(
+        self, session_id: str, limit: Optional[int] = None, before: Optional[int] = None
+    ) -> List[Message]:
+        """
+        Load a session's messages in order, or only the last `limit`, or only
+        those before the message numbered `before`.
+        """
+        with self._lock:
+            if before is not None:
+                rows = self._conn.execute(
+                    "SELECT seq, kind, content FROM messages WHERE session_id = ? AND seq < ? "
+                    "ORDER BY seq",
+                    (session_id, before),
+                ).fetchall()
+            elif limit is None:
+                rows = self._conn.execute(
+                    "SELECT seq, kind, content FROM messages WHERE session_id = ? ORDER BY seq",
+                    (session_id,),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT seq, kind, content FROM messages WHERE session_id = ? "
+                    "ORDER BY seq DESC LIMIT ?",
+                    (session_id, limit),
+                ).fetchall()[::-1]
+        return [Message(*row) for row in rows]
+
+    def _count(self, session_id: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def _delete(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+class Session:
+    """
+    One conversation, with its recent messages in memory and the rest on disk.
+    """
+
+    def __init__(self, store: SessionStore, session_id: str) -> None:
+        self.store = store
+        self.session_id = session_id
+        self._recent: deque = deque(store._load(session_id, store.window), maxlen=store.window)
+        self._count = store._count(session_id)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, kind: str, content: str) -> Message:
+        """Add a message to the end of the conversation."""
+        message = Message(self._count, kind, content)
+        self.store._append(self.session_id, message.seq, kind, content)
+        self._recent.append(message)
+        self._count += 1
+        return message
+
+    def recent(self) -> List[Message]:
+        """The in-memory window of recent messages, oldest first."""
+        return list(self._recent)
+
+    def earlier(self) -> List[Message]:
+        """Messages older than the in-memory window, read from disk."""
+        oldest = self._recent[0].seq if self._recent else self._count
+        return self.store._load(self.session_id, before=oldest) if oldest > 0 else []
+
+    def history(self) -> Iterator[Message]:
+        """Every message of the conversation, oldest first."""
+        if self._count <= len(self._recent):
+            return iter(self.recent())
+        return iter(self.store._load(self.session_id))
+
+    def clear(self) -> None:
+        """Delete the conversation."""
+        self.store._delete(self.session_id)
+        self._recent.clear()
+        self._count = 0
@@ -0,0 +1,292 @@
+"""
+This module provides a KnowledgeBase that splits the symptom matrix across a
+pool of worker processes and answers searches by scatter-gather.
+
+The normalized search matrix lives in one shared memory block, which also
+backs the index's `search_matrix` in the parent, so the matrix is held once.
+Each worker maps its own range of rows from that block without copying,
+scores every query batch against it, and returns its local top-k. The parent
+merges the per-shard results, so callers keep using `get_relevant_entries`.
+
+Concurrent searches don't wait for each other: every worker has one pipe per
+lane, and a search holds a lane only for its own round trip. A worker that
+dies is detected by its closed pipe, and the pool is restarted, at most
+MAX_RESTARTS times for one search.
+
+Workers are started with the spawn method, so they don't inherit the
+parent's threads, locks or open connections.
+"""
+import atexit
+import heapq
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import connection, shared_memory
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_base import KnowledgeBase, Match, _Index, top_matches
+
+DEFAULT_LANES = 4
+MAX_RESTARTS = 2
+
+_mp_context = mp.get_context("spawn")
+
+
+class _SharedBlock(np.ndarray):
+    """
+    An array over a shared memory block. It keeps the block mapped for as long
+    as any view of the array lives.
+    """
+
+
+def _share(matrix: np.ndarray) -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+    """Copy a matrix into a new shared memory block and return a view of it with the block."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    block = np.ndarray.__new__(_SharedBlock, matrix.shape, dtype=np.float32, buffer=shm.buf)
+    # Closing the block under a live view would crash, so the view owns it
+    block.shm = shm
+    shared = block.view(np.ndarray)
+    shared[:] = matrix
+    return shared, shm
+
+
+def _shard_worker(conns: list, shm_name: str, shape: tuple, start: int, stop: int) -> None:
+    """
+    Serve searches for rows [start, stop) of the shared search matrix.
+
+    Each request is a (query_vectors, threshold, top_k) tuple on one of the
+    worker's pipes, and the reply, the list of matches per query, goes back
+    on the same pipe. A None request stops the worker, as does the parent
+    closing every pipe.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)[start:stop]
+    try:
+        while conns:
+            for conn in connection.wait(conns):
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    conns.remove(conn)
+                    continue
+                if request is None:
+                    return
+                query_vectors, threshold, top_k = request
+                conn.send(top_matches(matrix, query_vectors, threshold, top_k, offset=start))
+    finally:
+        del matrix
+        shm.close()
+        for conn in conns:
+            conn.close()
+
+
+class _ShardPool:
+    """
+    Worker processes serving one index version from its shared memory block.
+    """
+
+    def __init__(
+        self, index: _Index, shm: shared_memory.SharedMemory, num_shards: int, lanes: int
+    ) -> None:
+        """
+        Start the workers.
+
+        Parameters:
+            index (_Index): The index version served; its search matrix is
+                backed by `shm`.
+            shm (SharedMemory): The block holding the search matrix.
+            num_shards (int): Number of worker processes.
+            lanes (int): Searches that can run at the same time.
+        """
+        self.index = index
+        self.shm = shm
+        self.closed = False
+        self.broken = False
+        self.lock = threading.Lock()
+        self.workers: List[mp.process.BaseProcess] = []
+        self.conns: List[Any] = []
+        # Each lane is one pipe to every worker
+        self._lanes: queue.Queue = queue.Queue()
+        self._num_lanes = lanes
+
+        shape = index.search_matrix.shape
+        rows = shape[0]
+        num_shards = max(1, min(num_shards, rows))
+        bounds = np.linspace(0, rows, num_shards + 1).astype(int)
+        lane_conns: List[List[Any]] = [[] for _ in range(lanes)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            pipes = [_mp_context.Pipe() for _ in range(lanes)]
+            worker = _mp_context.Process(
+                target=_shard_worker,
+                args=([child for _, child in pipes], shm.name, shape, int(start), int(stop)),
+                daemon=True,
+            )
+            worker.start()
+            for conns, (parent_conn, child_conn) in zip(lane_conns, pipes):
+                child_conn.close()
+                conns.append(parent_conn)
+                self.conns.append(parent_conn)
+            self.workers.append(worker)
+        for conns in lane_conns:
+            self._lanes.put(conns)
+
+    def scatter_gather(
+        self, query_vectors: np.ndarray, threshold: float, top_k: Optional[int]
+    ) -> Optional[List[List[List[Match]]]]:
+        """
+        Send the query batch to every shard and collect their results, or
+        return None if the pool is closed or a worker has died.
+        """
+        lane = self._lanes.get()
+        try:
+            if self.closed or self.broken:
+                return None
+            for conn in lane:
+                conn.send((query_vectors, threshold, top_k))
+            return [conn.recv() for conn in lane]
+        except (EOFError, OSError):
+            # A worker is gone; its lane may hold unread replies, so the pool is retired
+            self.broken = True
+            return None
+        finally:
+            self._lanes.put(lane)
+
+    def close(self) -> None:
+        """Stop the workers once in-flight searches finish, or after 5 seconds."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        deadline = time.monotonic() + 5
+        lanes = []
+        for _ in range(self._num_lanes):
+            try:
+                lanes.append(self._lanes.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        for worker in self.workers:
+            worker.join(timeout=max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                worker.terminate()
+        # Searches still waiting for a lane find the pool closed
+        for lane in lanes:
+            self._lanes.put(lane)
+
+
+class ShardedKnowledgeBase(KnowledgeBase):
+    """
+    A KnowledgeBase that scores queries on several worker processes.
+
+    Every index version gets its own shared memory block and shard pool. A
+    new pool is started before it replaces the old one, and the old pool is
+    only stopped after the searches running on it have finished. A pool with
+    a dead worker is replaced by a new pool for the same version.
+    """
+
+    def __init__(
+        self,
+        cache_file: str = "embeddings_cache.json",
+        num_shards: Optional[int] = None,
+        lanes: int = DEFAULT_LANES,
+        **kwargs,
+    ):
+        """
+        Initialize the sharded knowledge base.
+
+        Parameters:
+            cache_file (str): The path to the embeddings cache.
+            num_shards (int): Number of worker processes (default: CPU count).
+            lanes (int): Searches that can run at the same time.
+            **kwargs: Passed on to KnowledgeBase.
+        """
+        super().__init__(cache_file, **kwargs)
+        self.num_shards = num_shards or os.cpu_count() or 1
+        self.lanes = lanes
+        self._pool: Optional[_ShardPool] = None
+        self._pool_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _publish(self, index: _Index) -> None:
+        """Start shards for the new index version, swap them in and stop the old ones."""
+        # Not published yet, so the heap copy can still be swapped for the shared one
+        index.search_matrix, shm = _share(index.search_matrix)
+        pool = _ShardPool(index, shm, self.num_shards, self.lanes)
+        with self._pool_lock:
+            old_pool, self._pool = self._pool, pool
+            super()._publish(index)
+        if old_pool is not None:
+            old_pool.close()
+            old_pool.shm.unlink()
+
+    def _restart(self, pool: _ShardPool) -> None:
+        """Replace a pool whose worker died, unless it was already replaced."""
+        with self._pool_lock:
+            if self._pool is not pool:
+                return
+            print("A knowledge base shard stopped; restarting the shards")
+            self._pool = _ShardPool(pool.index, pool.shm, self.num_shards, self.lanes)
+        pool.close()
+
+    def _search(
+        self, query_embeddings: np.ndarray, threshold: float, top_k: Optional[int]
+    ) -> Tuple[_Index, List[List[Match]]]:
+        """
+        Project the query batch for the pool's index version, scatter it to
+        every shard and merge the per-shard top-k.
+
+        Raises:
+            RuntimeError: If the knowledge base is closed, or the shards keep
+                failing after MAX_RESTARTS restarts.
+        """
+        restarts = 0
+        while True:
+            pool = self._pool
+            if pool is None:
+                raise RuntimeError("Knowledge base is closed")
+            query_vectors = np.ascontiguousarray(
+                self._search_vectors(query_embeddings, pool.index.projection),
+                dtype=np.float32,
+            )
+            shard_results = pool.scatter_gather(query_vectors, threshold, top_k)
+            if shard_results is not None:
+                break
+            if pool.broken:
+                if restarts == MAX_RESTARTS:
+                    raise RuntimeError(
+                        f"Knowledge base shards failed after {restarts} restarts"
+                    )
+                restarts += 1
+                self._restart(pool)
+
+        merged = []
+        for per_query in zip(*shard_results):
+            matches = heapq.merge(*per_query, key=lambda match: -match[1])
+            if top_k is not None:
+                matches = list(matches)[:top_k]
+            merged.append(list(matches))
+        return pool.index, merged
+
+    def close(self) -> None:
+        """Stop the workers and release the shared memory."""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.shm.unlink()
+
+    def __enter__(self) -> "ShardedKnowledgeBase":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
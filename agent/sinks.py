@@ -0,0 +1,252 @@
+"""
+This module contains the output sinks agents write their streamed responses to.
+
+The sink is chosen per deployment: a batching console sink for local runs, a
+log file, a UI callback, or a null sink so production servers do no terminal
+output on the hot path.
+"""
+import sys
+import threading
+import time
+import typing
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+import colorama
+
+from printer import COLORS
+
+
+class OutputSink:
+    """
+    Receives the text agents produce. Subclasses override `write` and, if they
+    buffer, `flush` and `close`.
+    """
+
+    def write(self, agent: str, color: str, text: str) -> None:
+        """
+        Write a piece of an agent's output.
+
+        Parameters:
+            agent (str): Name of the agent.
+            color (str): The agent's color, a key of printer.COLORS.
+            text (str): The text, written as-is without a trailing newline.
+        """
+
+    def flush(self) -> None:
+        """Emit anything buffered by the calling thread."""
+
+    def close(self) -> None:
+        """Flush and release resources."""
+        self.flush()
+
+
+class NullSink(OutputSink):
+    """
+    Discards all output.
+    """
+
+
+class _Buffer:
+    """
+    One thread's batch of console output.
+    """
+
+    __slots__ = ("parts", "size", "since", "color", "lock", "__weakref__")
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.size = 0
+        self.since = 0.0
+        self.color: Optional[str] = None
+        self.lock = threading.Lock()
+
+
+def _flush_stale_buffers(sink_ref: "weakref.ref[ConsoleSink]", interval: float) -> None:
+    """Flush a console sink's stale buffers every `interval` seconds until it is gone."""
+    while True:
+        time.sleep(interval)
+        sink = sink_ref()
+        if sink is None or sink._closed:
+            return
+        sink._flush_stale()
+        del sink
+
+
+class ConsoleSink(OutputSink):
+    """
+    Writes colored output to the console in batches.
+
+    Each thread has its own buffer, emitted with a single write once it holds
+    `max_buffer` characters or is `flush_interval` seconds old, so concurrent
+    responses don't interleave chunk by chunk. A background thread flushes
+    buffers that stop receiving text, e.g. while a stream stalls, so nothing
+    stays buffered much longer than `flush_interval`.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 0.1,
+        max_buffer: int = 4096,
+        stream: Optional[typing.TextIO] = None,
+    ) -> None:
+        """
+        Initialize the ConsoleSink.
+
+        Parameters:
+            flush_interval (float): Longest time text stays buffered, in seconds.
+            max_buffer (int): Buffered characters that trigger a flush.
+            stream (TextIO): Where to write (default: sys.stdout at flush time).
+        """
+        self._flush_interval = flush_interval
+        self._max_buffer = max_buffer
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Buffers go away with their threads
+        self._buffers: "weakref.WeakSet[_Buffer]" = weakref.WeakSet()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _buffer(self) -> _Buffer:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = _Buffer()
+            with self._lock:
+                self._buffers.add(buffer)
+                if self._flusher is None and self._flush_interval > 0:
+                    # Holds only a weak reference, so unused sinks are still collected
+                    self._flusher = threading.Thread(
+                        target=_flush_stale_buffers,
+                        args=(weakref.ref(self), self._flush_interval),
+                        name="console-sink-flush",
+                        daemon=True,
+                    )
+                    self._flusher.start()
+        return buffer
+
+    def write(self, agent: str, color: str, text: str) -> None:
+        buffer = self._buffer()
+        with buffer.lock:
+            if not buffer.parts:
+                buffer.since = time.monotonic()
+            if buffer.color != color:
+                buffer.parts.append(COLORS[color])
+                buffer.color = color
+            buffer.parts.append(text)
+            buffer.size += len(text)
+            due = (
+                buffer.size >= self._max_buffer
+                or time.monotonic() - buffer.since >= self._flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        self._emit(self._buffer())
+
+    def close(self) -> None:
+        self.flush()
+        self._closed = True
+
+    def _flush_stale(self) -> None:
+        """Emit every buffer holding text older than the flush interval."""
+        with self._lock:
+            buffers = list(self._buffers)
+        cutoff = time.monotonic() - self._flush_interval
+        for buffer in buffers:
+            self._emit(buffer, cutoff)
+
+    def _emit(self, buffer: _Buffer, stale_before: Optional[float] = None) -> None:
+        """Write out a buffer, or only if its text is older than `stale_before`."""
+        # Held while writing, so a thread's batches reach the stream in order
+        with buffer.lock:
+            if not buffer.parts or (stale_before is not None and buffer.since > stale_before):
+                return
+            output = "".join(buffer.parts) + colorama.Style.RESET_ALL
+            buffer.parts, buffer.size, buffer.color = [], 0, None
+            stream = self._stream or sys.stdout
+            with self._lock:
+                stream.write(output)
+                stream.flush()
+
+
+class LogFileSink(OutputSink):
+    """
+    Appends plain output to a log file, written once per flushed response.
+
+    The file is only open while a response is written, so sinks created on
+    every Streamlit rerun don't leak file handles.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the LogFileSink.
+
+        Parameters:
+            path (str): The log file, appended to.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def write(self, agent: str, color: str, text: str) -> None:
+        parts: List[str] = getattr(self._local, "parts", None)
+        if parts is None:
+            parts = self._local.parts = []
+        parts.append(text)
+
+    def flush(self) -> None:
+        parts = getattr(self._local, "parts", None)
+        if not parts:
+            return
+        output = "".join(parts)
+        parts.clear()
+        with self._lock:
+            with open(self._path, "a", encoding="utf-8") as file:
+                file.write(output)
+
+
+class CallbackSink(OutputSink):
+    """
+    Forwards every piece of output to a callback, e.g. a UI element that
+    streams the response.
+    """
+
+    def __init__(self, callback: Callable[[str, str], None]) -> None:
+        """
+        Initialize the CallbackSink.
+
+        Parameters:
+            callback (Callable[[str, str], None]): Called with the agent name and text.
+        """
+        self._callback = callback
+
+    def write(self, agent: str, color: str, text: str) -> None:
+        self._callback(agent, text)
+
+
+def create_sink(sink_config: Dict[str, Any]) -> OutputSink:
+    """
+    Create an output sink from its configuration.
+
+    Parameters:
+        sink_config (dict[str, Any]): "type" is "console", "null" or "log"; the
+            other keys are passed to the sink ("flush_interval" and "max_buffer"
+            for console, "path" for log).
+
+    Returns:
+        OutputSink: The configured sink.
+
+    Raises:
+        ValueError: If the type is unknown.
+    """
+    settings = dict(sink_config)
+    sink_type = settings.pop("type", "console")
+    if sink_type == "console":
+        return ConsoleSink(**settings)
+    if sink_type == "null":
+        return NullSink()
+    if sink_type == "log":
+        return LogFileSink(**settings)
+    raise ValueError(f"Invalid output sink type: {sink_type}")
@@ -0,0 +1,161 @@
+"""
+This module writes and maps the prebuilt startup snapshot.
+
+A snapshot is one file holding the validated configuration, the parsed
+dataset and the knowledge base arrays (embeddings, search matrix and
+projection). Arrays are stored raw and aligned, so a new worker maps them with
+np.memmap instead of parsing the CSV and the JSON embeddings cache.
+
+Layout: MAGIC, an 8-byte little-endian header length, a JSON header, then each
+array at the offset recorded in the header.
+"""
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MAGIC = b"RAGSNAP1"
+DEFAULT_PATH = "startup.snapshot"
+ALIGNMENT = 64
+
+
+def source_digest(paths: List[str]) -> str:
+    """Hash the files a snapshot is built from, to detect a stale snapshot."""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Snapshot:
+    """
+    A mapped snapshot: metadata from the header and read-only memory-mapped arrays.
+    """
+
+    def __init__(self, header: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> None:
+        self.header = header
+        self.arrays = arrays
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return self.header["config"]
+
+    @property
+    def dataset(self) -> List[Dict[str, Any]]:
+        return self.header["dataset"]
+
+    @property
+    def source(self) -> str:
+        return self.header["source"]
+
+
+def write_snapshot(
+    file_path: str,
+    config: Dict[str, Any],
+    dataset: List[Dict[str, Any]],
+    arrays: Dict[str, np.ndarray],
+    source: str,
+    extra: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Write a snapshot file atomically.
+
+    Parameters:
+        file_path (str): Where to write the snapshot.
+        config (dict[str, Any]): The validated configuration.
+        dataset (list[dict[str, Any]]): The parsed dataset rows.
+        arrays (dict[str, np.ndarray]): Named arrays to store.
+        source (str): Digest of the files the snapshot was built from.
+        extra (dict[str, Any]): Additional JSON metadata.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    specs = {}
+    # Offsets are relative to the data section, which starts after the header
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        specs[name] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        offset += array.nbytes
+    header = {
+        "config": config,
+        "dataset": dataset,
+        "arrays": specs,
+        "source": source,
+        **(extra or {}),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.seek(data_start + specs[name]["offset"])
+            file.write(array.tobytes())
+    os.replace(tmp_path, file_path)
+
+
+def load_snapshot(file_path: str) -> Optional[Snapshot]:
+    """
+    Map a snapshot file, or return None if it doesn't exist or isn't a snapshot.
+
+    Parameters:
+        file_path (str): The snapshot file.
+
+    Returns:
+        Snapshot: The header and read-only memory-mapped arrays.
+    """
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        (header_length,) = struct.unpack("<Q", file.read(8))
+        header = json.loads(file.read(header_length))
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+            continue
+        arrays[name] = np.memmap(
+            file_path,
+            dtype=spec["dtype"],
+            mode="r",
+            offset=data_start + spec["offset"],
+            shape=shape,
+        )
+    return Snapshot(header, arrays)
+
+
+def load_current_snapshot(file_path: str, config_path: str) -> Optional[Snapshot]:
+    """
+    Map a snapshot only if it was built from the current configuration and
+    dataset files.
+
+    Parameters:
+        file_path (str): The snapshot file.
+        config_path (str): The configuration file the snapshot must match.
+
+    Returns:
+        Snapshot: The mapped snapshot, or None if it is missing or out of date.
+    """
+    snapshot = load_snapshot(file_path)
+    if snapshot is None:
+        return None
+    try:
+        source = source_digest([config_path, snapshot.config["dataset"]])
+    except OSError:
+        return None
+    if source != snapshot.source:
+        print("Startup snapshot is out of date; loading configuration and dataset")
+        return None
+    return snapshot
@@ -0,0 +1,98 @@
+"""
+This module provides startup helpers: lazy imports of heavy dependencies and a
+profile mode that reports what process startup spends its time on.
+
+Set RAG_PROFILE_STARTUP=1 to print, after the first run of main(), the
+inclusive import time of every module loaded during startup and the time of
+each initialization step.
+"""
+import builtins
+import contextlib
+import importlib.util
+import os
+import sys
+import time
+import types
+from typing import Dict, Iterator, List, Tuple
+
+PROFILE_ENV = "RAG_PROFILE_STARTUP"
+
+_import_times: Dict[str, float] = {}
+_steps: List[Tuple[str, float]] = []
+_profiling = False
+_reported = False
+_original_import = builtins.__import__
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Import a module on first attribute access instead of now.
+
+    Parameters:
+        name (str): The module name.
+
+    Returns:
+        ModuleType: The module, or a placeholder that loads it when first used.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    top_level = name.partition(".")[0]
+    if level or top_level in sys.modules or top_level in _import_times:
+        return _original_import(name, globals, locals, fromlist, level)
+    # Reserve the entry so nested imports of the same package aren't timed twice
+    _import_times[top_level] = 0.0
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _import_times[top_level] = time.perf_counter() - start
+
+
+def enable_profiling_from_env() -> None:
+    """Start timing imports if the profile mode is enabled in the environment."""
+    global _profiling
+    if _profiling or _reported or not os.getenv(PROFILE_ENV):
+        return
+    _profiling = True
+    builtins.__import__ = _timed_import
+
+
+@contextlib.contextmanager
+def step(name: str) -> Iterator[None]:
+    """Time an initialization step when profiling."""
+    if not _profiling:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _steps.append((name, time.perf_counter() - start))
+
+
+def report() -> None:
+    """Print the startup profile once and stop timing imports."""
+    global _profiling, _reported
+    if not _profiling:
+        return
+    builtins.__import__ = _original_import
+    _profiling = False
+    _reported = True
+    print("Startup profile (import times include nested imports):")
+    for name, seconds in sorted(_import_times.items(), key=lambda item: -item[1]):
+        if seconds >= 0.001:
+            print(f"  import {name:<30} {seconds * 1000:9.1f} ms")
+    for name, seconds in _steps:
+        print(f"  step   {name:<30} {seconds * 1000:9.1f} ms")
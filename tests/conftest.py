@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app runs from the agent directory and imports its modules flat
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "agent"))
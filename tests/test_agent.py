@@ -0,0 +1,58 @@
+import os
+import time
+
+import openai
+import pytest
+
+import config
+from agent import Agent
+from routing import Route
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), os.pardir, "agent", "agent.json")
+
+
+class FakeClient:
+    def __init__(self, slow_models=(), delay=0.0):
+        self.slow_models = slow_models
+        self.delay = delay
+        self.calls = []
+
+    def chat_completion(self, model, request_timeout, **kwargs):
+        self.calls.append((model, request_timeout))
+        if model in self.slow_models:
+            time.sleep(min(self.delay, request_timeout))
+            raise openai.error.Timeout("Request timed out")
+        chunk = {"choices": [{"delta": {"content": f"from {model}"}}]}
+        return iter([openai.openai_object.OpenAIObject.construct_from(chunk)])
+
+
+def make_agent(client, route, timeout=30):
+    return Agent(
+        "gpt-4o-mini", 100, 10, timeout=timeout, client=client, routes={"diagnosis": route}
+    )
+
+
+def test_slow_primary_falls_back_within_the_deadline():
+    client = FakeClient(slow_models=("gpt-4o",), delay=0.2)
+    agent = make_agent(client, Route(["gpt-4o", "gpt-4o-mini"], timeout=0.1), timeout=1)
+    assert agent.get_full_response("hi", "diagnosis") == "from gpt-4o-mini"
+    (_, primary_timeout), (_, fallback_timeout) = client.calls
+    assert primary_timeout == 0.1
+    # The fallback only gets the time left
+    assert fallback_timeout <= 0.9
+
+
+def test_no_fallback_once_the_deadline_passed():
+    client = FakeClient(slow_models=("gpt-4o",), delay=0.3)
+    agent = make_agent(client, Route(["gpt-4o", "gpt-4o-mini"]), timeout=0.2)
+    with pytest.raises(openai.error.Timeout):
+        agent.get_full_response("hi", "diagnosis")
+    assert [model for model, _ in client.calls] == ["gpt-4o"]
+
+
+def test_route_timeout_must_leave_time_for_fallbacks():
+    settings = config.read_json(CONFIG_FILE)
+    config.validate(settings)
+    settings["agents"][0]["routes"]["diagnosis"]["timeout"] = settings["response_timeout"]
+    with pytest.raises(ValueError):
+        config.validate(settings)
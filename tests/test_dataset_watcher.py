@@ -0,0 +1,82 @@
+import csv
+import os
+
+import pytest
+
+from dataset_watcher import DatasetWatcher, diff_rows, read_rows
+from knowledge_base import KnowledgeBase
+from test_knowledge_base import FakeClient, row
+
+FIELDS = ["symptom", "conditions", "follow_up_questions"]
+
+
+def write_rows(path, rows, mtime):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = str(tmp_path / "symptoms.csv")
+    write_rows(path, [row(f"Symptom {i}") for i in range(4)], 1000)
+    return path
+
+
+@pytest.fixture
+def watcher(tmp_path, client, dataset):
+    kb = KnowledgeBase(str(tmp_path / "cache.json"), client=client, neighbor_k=2)
+    kb.load_dataset(read_rows(dataset))
+    return DatasetWatcher(kb, dataset, interval=60)
+
+
+def test_diff_rows_treats_a_rename_as_removal_and_addition():
+    old = [row("Cough"), row("Fever")]
+    new = [row("Dry cough"), row("fever", conditions="cold")]
+    upserts, removals = diff_rows(old, new)
+    assert upserts == [row("Dry cough"), row("fever", conditions="cold")]
+    assert removals == ["cough"]
+
+
+def test_diff_rows_ignores_unchanged_rows():
+    rows = [row("Cough"), row("Fever")]
+    assert diff_rows(rows, [dict(r) for r in rows]) == ([], [])
+
+
+def test_change_is_applied_once_the_file_is_unchanged_for_a_poll(watcher, dataset):
+    write_rows(dataset, [row(f"Symptom {i}") for i in range(5)], 2000)
+    assert not watcher.check()
+    assert watcher._kb.version == 1
+    assert watcher.check()
+    assert watcher._kb.version == 2
+    assert len(watcher._kb.dataset) == 5
+    assert not watcher.check()
+
+
+def test_file_still_being_written_is_not_read(watcher, dataset):
+    write_rows(dataset, [row("Symptom 0")], 2000)
+    assert not watcher.check()
+    write_rows(dataset, [row(f"Symptom {i}") for i in range(5)], 2001)
+    assert not watcher.check()
+    assert watcher.check()
+    assert [entry["symptom"] for entry in watcher._kb.dataset] == [
+        f"Symptom {i}" for i in range(5)
+    ]
+
+
+def test_failed_update_is_retried_on_the_next_poll(watcher, dataset, client):
+    write_rows(dataset, [row(f"Symptom {i}") for i in range(5)], 2000)
+    client.failures = 1
+    assert not watcher.check()
+    assert not watcher.check()
+    assert watcher._kb.version == 1
+    assert watcher.check()
+    assert watcher._kb.version == 2
+    assert client.calls[-1] == ["symptom 4"]
@@ -0,0 +1,115 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from knowledge_base import KnowledgeBase, _Index
+from neighbor_graph import NeighborGraph
+
+
+class FakeClient:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def embedding(self, input, model):
+        self.calls.append(list(input))
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Service unavailable")
+        return {"data": [{"embedding": embed(text)} for text in input]}
+
+
+def embed(text):
+    rng = np.random.default_rng(zlib.crc32(text.encode()))
+    return rng.standard_normal(8).tolist()
+
+
+def row(symptom, conditions="flu"):
+    return {"symptom": symptom, "conditions": conditions, "follow_up_questions": "How long?"}
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def kb(tmp_path, client):
+    kb = KnowledgeBase(str(tmp_path / "cache.json"), client=client, neighbor_k=2)
+    kb.load_dataset([row(f"Symptom {i}") for i in range(6)])
+    client.calls.clear()
+    return kb
+
+
+def test_conditions_only_update_reuses_the_embedding(kb, client):
+    embeddings = kb.symptom_embeddings
+    version = kb.update_entry(row("symptom 2", conditions="cold"))
+    assert version == 2
+    assert client.calls == []
+    assert kb.dataset[2]["conditions"] == "cold"
+    assert np.array_equal(kb.symptom_embeddings, embeddings)
+
+
+def test_add_entry_embeds_only_the_new_symptom(kb, client):
+    kb.add_entry(row("Symptom 6"))
+    assert client.calls == [["symptom 6"]]
+    assert len(kb.dataset) == 7
+    assert kb.get_relevant_entries("symptom 6", threshold=0.99)[0]["symptom"] == "Symptom 6"
+
+
+def test_adds_and_removals_rebuild_the_graph(kb):
+    graph = kb.graph
+    kb.add_entry(row("Symptom 6"))
+    added = kb.graph
+    assert added is not graph
+    assert added.indices.shape == (7, 2)
+    kb.remove_entry("SYMPTOM 0")
+    assert kb.graph is not added
+    assert kb.graph.indices.shape == (6, 2)
+    assert "symptom 0" not in [entry["symptom"].lower() for entry in kb.dataset]
+
+
+def test_update_keeps_the_graph(kb):
+    graph = kb.graph
+    kb.update_entry(row("Symptom 1", conditions="cold"))
+    assert kb.graph is graph
+
+
+def test_failed_embedding_keeps_the_current_version(kb, client):
+    client.failures = 1
+    with pytest.raises(RuntimeError):
+        kb.add_entry(row("Symptom 6"))
+    assert kb.version == 1
+    assert len(kb.dataset) == 6
+
+
+def test_update_of_unknown_symptom_raises_key_error(kb):
+    with pytest.raises(KeyError):
+        kb.update_entry(row("Symptom 9"))
+
+
+def test_update_before_loading_raises_runtime_error(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / "cache.json"), client=FakeClient())
+    with pytest.raises(RuntimeError, match="No dataset loaded"):
+        kb.update_entry(row("Symptom 0"))
+
+
+def test_expand_stops_at_the_edge_threshold():
+    graph = NeighborGraph(
+        np.array([[1, 2, 3], [0, 2, 3], [3, 0, 1], [2, 0, 1]]),
+        np.array([[0.9, 0.8, 0.6], [0.9, 0.7, 0.5], [0.95, 0.8, 0.7], [0.95, 0.6, 0.5]]),
+        3,
+    )
+    matrix = np.eye(4, dtype=np.float32)
+    index = _Index(1, [row(f"Symptom {i}") for i in range(4)], matrix, matrix, graph)
+    kb = KnowledgeBase()
+    # Row 0's edge to 3 and row 1's edges to 2 and 3 are below the threshold
+    assert kb._expand(index, [(0, 0.9)], 0.75) == [
+        (0, 0.9), (1, pytest.approx(0.81)), (2, pytest.approx(0.72))
+    ]
+    # An already matched row is not added again, and the best path wins
+    assert kb._expand(index, [(1, 0.8), (0, 0.9)], 0.7) == [
+        (1, 0.8), (0, 0.9), (2, pytest.approx(0.72))
+    ]
+    assert kb._expand(index, [(0, 0.9)], 0.95) == [(0, 0.9)]
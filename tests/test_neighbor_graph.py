@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from knowledge_base import KnowledgeBase
+from neighbor_graph import NeighborGraph
+
+
+def dense_neighbors(matrix, k):
+    scores = matrix @ matrix.T
+    np.fill_diagonal(scores, -np.inf)
+    indices = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+def rows(count, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return KnowledgeBase._normalize(rng.standard_normal((count, dim)).astype(np.float32))
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 4, 17, 1024])
+def test_blocked_build_matches_a_dense_sort(block_size):
+    matrix = rows(17)
+    graph = NeighborGraph.build(matrix, 4, block_size=block_size)
+    indices, similarities = dense_neighbors(matrix, 4)
+    assert np.array_equal(graph.indices, indices)
+    assert graph.similarities == pytest.approx(similarities, abs=1e-6)
+
+
+def test_duplicate_in_another_block_is_the_nearest_neighbor():
+    matrix = rows(6)
+    # Row i + 6 repeats row i, so with blocks of 4 every pair straddles a boundary
+    matrix = np.vstack([matrix, matrix])
+    graph = NeighborGraph.build(matrix, 2, block_size=4)
+    assert list(graph.indices[:, 0]) == [i + 6 for i in range(6)] + list(range(6))
+    assert graph.similarities[:, 0] == pytest.approx(np.ones(12), abs=1e-6)
+    assert all(graph.indices[i, 1] != i for i in range(12))
+
+
+def test_small_dataset_gets_all_other_rows():
+    graph = NeighborGraph.build(rows(3), 5, block_size=2)
+    assert graph.indices.shape == (3, 2)
+    assert [sorted(row) for row in graph.indices] == [[1, 2], [0, 2], [0, 1]]
+
+
+def test_single_row_has_no_neighbors():
+    graph = NeighborGraph.build(rows(1), 5)
+    assert graph.indices.shape == (1, 0)
+    assert graph.neighbors(0) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    graph = NeighborGraph.build(rows(10), 3, source="abc", block_size=4)
+    path = str(tmp_path / "graph.npz")
+    graph.save(path)
+    loaded = NeighborGraph.load(path)
+    assert np.array_equal(loaded.indices, graph.indices)
+    assert np.array_equal(loaded.similarities, graph.similarities)
+    assert (loaded.k, loaded.source) == (3, "abc")
+    assert NeighborGraph.load(str(tmp_path / "missing.npz")) is None
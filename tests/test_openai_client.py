@@ -0,0 +1,133 @@
+"""
+Tests of the OpenAI client layer against a local fake API server.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+from openai_client import OpenAIClient
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}}],
+}
+RATE_LIMITED = {"error": {"message": "Rate limit reached", "type": "requests"}}
+
+
+class FakeAPI(ThreadingHTTPServer):
+    """
+    Serves chat completions. Each request pops the next (status, headers)
+    from `responses`, answering 200 once it is empty, and records the
+    client address it came from.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.responses = []
+        self.clients = []
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.clients.append(self.client_address)
+            status, headers = self.server.responses.pop(0) if self.server.responses else (200, {})
+        time.sleep(self.server.delay)
+        body = json.dumps(COMPLETION if status == 200 else RATE_LIMITED).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FakeAPI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **settings):
+    settings = {"backoff_base": 0.01, "backoff_max": 0.01, **settings}
+    return OpenAIClient(api_base=server.api_base, api_key="sk-test", **settings)
+
+
+def chat(client, **kwargs):
+    return client.chat_completion(
+        model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}], **kwargs
+    )
+
+
+def test_connections_are_reused_across_threads(server):
+    client = make_client(server)
+    results = []
+    # One call per thread, one after another: only the client's shared pool
+    # (not openai's per-thread sessions) can serve them on one connection
+    for _ in range(3):
+        thread = threading.Thread(target=lambda: results.append(chat(client)))
+        thread.start()
+        thread.join()
+    assert [r.choices[0].message.content for r in results] == ["ok"] * 3
+    assert len(server.clients) == 3
+    assert len(set(server.clients)) == 1
+
+
+def test_rate_limit_is_retried_after_retry_after(server):
+    server.responses = [(429, {"Retry-After": "0.3"})]
+    client = make_client(server)
+    start = time.monotonic()
+    assert chat(client).choices[0].message.content == "ok"
+    assert time.monotonic() - start >= 0.3
+    assert len(server.clients) == 2
+
+
+def test_retry_budget_exhaustion(server):
+    server.responses = [(429, {"Retry-After": "0"})] * 10
+    client = make_client(server, max_retries=5, retry_budget_ratio=0.0, retry_budget_burst=1)
+    with pytest.raises(openai.error.RateLimitError):
+        chat(client)
+    # One retry from the budget, however many the call allows
+    assert len(server.clients) == 2
+    with pytest.raises(openai.error.RateLimitError):
+        chat(client)
+    assert len(server.clients) == 3
+
+
+def test_concurrency_slot_is_released_while_backing_off(server):
+    server.responses = [(429, {"Retry-After": "1.0"})]
+    client = make_client(server, max_concurrency={"chat": 1})
+    backing_off = threading.Thread(target=lambda: chat(client))
+    backing_off.start()
+    while not server.clients:
+        time.sleep(0.01)
+    # The only chat slot is free while the first call waits out Retry-After
+    start = time.monotonic()
+    assert chat(client).choices[0].message.content == "ok"
+    assert time.monotonic() - start < 0.5
+    backing_off.join()
+    assert len(server.clients) == 3
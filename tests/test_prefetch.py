@@ -0,0 +1,90 @@
+"""
+Tests of the prefetch stage with stand-in knowledge bases.
+"""
+import time
+
+import scheduler
+from prefetch import Prefetcher, PrefetchState
+
+
+class FakeKnowledgeBase:
+    version = 1
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def get_relevant_entries_batch(self, queries, threshold=0.7, top_k=None, expand=False):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [[{"symptom": query}] for query in queries]
+
+
+def test_turn_with_nothing_prefetched_makes_no_embeddings_call():
+    kb = FakeKnowledgeBase(delay=1.0)
+    prefetcher = Prefetcher(kb)
+    start = time.monotonic()
+    assert prefetcher.relevant_entries(PrefetchState(), ["headache"], prefetched_only=True) == [[]]
+    assert time.monotonic() - start < 0.1
+    prefetcher._retrieval_executor.shutdown(wait=True)
+    assert kb.calls == 0
+
+
+def test_failed_retrieval_returns_no_entries():
+    kb = FakeKnowledgeBase(error=RuntimeError("Could not get embeddings for the queries"))
+    prefetcher = Prefetcher(kb)
+    assert prefetcher.relevant_entries(PrefetchState(), ["headache"], timeout=1.0) == [[]]
+
+
+def test_slow_retrieval_is_time_boxed_and_kept_for_the_next_turn():
+    kb = FakeKnowledgeBase(delay=0.3)
+    prefetcher = Prefetcher(kb)
+    state = PrefetchState()
+    start = time.monotonic()
+    assert prefetcher.relevant_entries(state, ["headache"], timeout=0.05) == [[]]
+    assert time.monotonic() - start < 0.2
+    time.sleep(0.4)
+    assert prefetcher.relevant_entries(state, ["headache"], timeout=0.05) == [[{"symptom": "headache"}]]
+    assert kb.calls == 1
+
+
+def test_prefetched_retrieval_is_a_hit():
+    kb = FakeKnowledgeBase()
+    prefetcher = Prefetcher(kb)
+    state = PrefetchState()
+    prefetcher.schedule(state, [("user", "headache")], ["headache"])
+    prefetcher._executor.shutdown(wait=True)
+    assert prefetcher.relevant_entries(state, ["headache"], timeout=0.05) == [[{"symptom": "headache"}]]
+    assert prefetcher.stats.summary()["retrieval"]["hits"] == 1
+
+
+def test_speculation_is_capped_per_conversation():
+    started = []
+    prefetcher = Prefetcher(max_speculations=2)
+    state = PrefetchState()
+    for turn in range(4):
+        turns = [("user", f"message {turn}")]
+        prefetcher.schedule(state, turns, [], lambda turns, cancelled: started.append(turns))
+        # Let it start before the next reply discards it
+        time.sleep(0.05)
+    prefetcher._executor.shutdown(wait=True)
+    assert len(started) == 2
+
+
+def test_claimed_speculation_runs_at_the_callers_priority():
+    def speculate(turns, cancelled):
+        deadline = time.monotonic() + 2
+        while scheduler.current_priority() != scheduler.IN_PROGRESS and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return {"DiagnosticAgent": scheduler.PRIORITY_NAMES[scheduler.current_priority()]}
+
+    prefetcher = Prefetcher()
+    state = PrefetchState()
+    turns = [("user", "headache")]
+    prefetcher.schedule(state, turns, [], speculate)
+    time.sleep(0.05)
+    with scheduler.priority(scheduler.IN_PROGRESS):
+        assert prefetcher.take_speculation(state, turns) == {"DiagnosticAgent": "in_progress"}
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from knowledge_base import KnowledgeBase, _Index
+from projection import Projection
+
+
+def embeddings(rows=30, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    # Like OpenAI embeddings, rows share a large common direction
+    data = rng.standard_normal((rows, dim)) * 0.3 + rng.standard_normal(dim)
+    return KnowledgeBase._normalize(data.astype(np.float32))
+
+
+def test_pca_keeps_the_similarity_scale_of_held_out_queries():
+    data = embeddings(rows=40)
+    rows, queries = data[:30], data[30:]
+    projection = Projection.fit(rows, 29, "pca")
+    full_scores = queries @ rows.T
+    reduced_scores = (
+        KnowledgeBase._search_vectors(queries, projection)
+        @ KnowledgeBase._search_vectors(rows, projection).T
+    )
+    assert abs((reduced_scores - full_scores).mean()) < 0.01
+    assert np.abs(reduced_scores - full_scores).max() < 0.05
+
+
+def test_projection_is_refitted_when_the_requested_dim_changes(tmp_path):
+    data = embeddings()
+    symptoms = [f"symptom {i}" for i in range(len(data))]
+    kb = KnowledgeBase(cache_file=str(tmp_path / "cache.json"), projection_dim=8)
+    assert kb._load_projection(symptoms, data).dim == 8
+
+    # More dimensions than the first fit must not reuse the saved 8
+    kb.projection_dim = 16
+    assert kb._load_projection(symptoms, data).dim == 16
+    kb.projection_dim = 64
+    projection = kb._load_projection(symptoms, data)
+    assert projection.dim == 30 and projection.requested_dim == 64
+    assert Projection.load(kb.projection_file).requested_dim == 64
+
+
+def test_searches_project_queries_with_their_index_version(tmp_path):
+    data = embeddings()
+    dataset = [{"symptom": f"symptom {i}"} for i in range(len(data))]
+    kb = KnowledgeBase(cache_file=str(tmp_path / "cache.json"), neighbor_k=0)
+    kb._embeddings_cache = {"query": data[3].tolist()}
+    for version, dim in enumerate([8, 4], 1):
+        projection = Projection.fit(data, dim, "pca")
+        search_matrix = KnowledgeBase._search_vectors(data, projection)
+        kb._publish(_Index(version, dataset, data, search_matrix, projection=projection))
+
+        assert kb.projection is projection
+        scores = KnowledgeBase._search_vectors(data[3], projection) @ search_matrix.T
+        entries = kb.get_relevant_entries("query", -1.0, top_k=1)
+        assert entries[0]["symptom"] == f"symptom {np.argmax(scores)}"
+        assert entries[0]["similarity"] == pytest.approx(scores.max())
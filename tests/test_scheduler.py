@@ -0,0 +1,87 @@
+"""
+Tests of the admission scheduler's priority order.
+"""
+import threading
+import time
+
+import pytest
+
+import scheduler
+from scheduler import AdmissionScheduler, PriorityLevel
+
+
+def admit_in_order(raise_first):
+    admission = AdmissionScheduler(300, 10 ** 9, max_poll_interval=0.02)
+    # Empty the request bucket so calls queue; it refills one call per 0.2s
+    admission._buckets._state["requests"] = 0.0
+    admitted = []
+    background = PriorityLevel(scheduler.BATCH)
+
+    def call(name, level):
+        admission.acquire(1, level)
+        admitted.append(name)
+
+    threads = [threading.Thread(target=call, args=("background", background))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=call, args=("new", scheduler.NEW_SESSION)))
+    threads[1].start()
+    time.sleep(0.05)
+    if raise_first:
+        background.raise_to(scheduler.IN_PROGRESS)
+    for thread in threads:
+        thread.join()
+    return admitted
+
+
+def test_higher_priority_is_admitted_first():
+    assert admit_in_order(raise_first=False) == ["new", "background"]
+
+
+def test_raised_priority_moves_a_waiting_call_up():
+    assert admit_in_order(raise_first=True) == ["background", "new"]
+
+
+def test_priority_context():
+    assert scheduler.current_priority() == scheduler.NEW_SESSION
+    level = PriorityLevel(scheduler.BATCH)
+    with scheduler.priority(level):
+        assert scheduler.current_priority() == scheduler.BATCH
+        level.raise_to(scheduler.IN_PROGRESS)
+        assert scheduler.current_priority() == scheduler.IN_PROGRESS
+
+
+def test_metrics_report_depth_by_priority_and_wait_percentiles():
+    admission = AdmissionScheduler(300, 10 ** 9, max_poll_interval=0.02)
+    admission._buckets._state["requests"] = 0.0
+    threads = [
+        threading.Thread(target=admission.acquire, args=(1, level))
+        for level in (scheduler.BATCH, scheduler.NEW_SESSION, scheduler.BATCH)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    metrics = admission.metrics()
+    assert metrics["queue_depth"] == 3
+    assert metrics["queue_depth_by_priority"] == {"in_progress": 0, "new_session": 1, "batch": 2}
+    for thread in threads:
+        thread.join()
+
+    metrics = admission.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["admitted"] == {"in_progress": 0, "new_session": 1, "batch": 2}
+    # One call is admitted every 0.2s
+    assert 0.15 < metrics["wait_max"] < 1.0
+    assert metrics["wait_p50"] <= metrics["wait_p95"] <= metrics["wait_max"]
+    assert "Admission: 0 queued" in admission.report()
+
+
+def test_wait_percentiles():
+    admission = AdmissionScheduler(60, 1000)
+    admission._waits.extend((scheduler.BATCH, i / 100) for i in range(100))
+    metrics = admission.metrics()
+    assert metrics["wait_mean"] == pytest.approx(0.495)
+    assert metrics["wait_p50"] == 0.5
+    assert metrics["wait_p95"] == 0.95
+    assert metrics["wait_max"] == 0.99
+    assert "p50 0.50s, p95 0.95s, max 0.99s" in admission.report()
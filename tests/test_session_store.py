@@ -0,0 +1,47 @@
+import sqlite3
+
+from session_store import SessionStore
+
+
+def test_earlier_reads_only_messages_before_the_window(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"), window=3)
+    session = store.session()
+    for i in range(7):
+        session.append("user", f"message {i}")
+
+    assert [m.seq for m in session.recent()] == [4, 5, 6]
+    assert [m.content for m in session.earlier()] == [f"message {i}" for i in range(4)]
+    assert [m.seq for m in store.session(session.session_id).earlier()] == [0, 1, 2, 3]
+
+
+def test_idle_sessions_are_purged(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"), ttl=3600)
+    idle, active = store.session(), store.session()
+    idle.append("user", "hello")
+    active.append("user", "hello")
+    with store._conn:
+        store._conn.execute(
+            "UPDATE sessions SET last_active = 0 WHERE session_id = ?", (idle.session_id,)
+        )
+
+    assert store.purge() == 1
+    assert len(store.session(idle.session_id)) == 0
+    assert len(store.session(active.session_id)) == 1
+
+
+def test_sessions_stored_before_tracking_expire_from_now(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE messages (session_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "kind TEXT NOT NULL, content TEXT NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+        conn.execute("INSERT INTO messages VALUES ('old', 0, 'user', 'hello')")
+    conn.close()
+
+    store = SessionStore(db_path, ttl=3600)
+    assert store.purge() == 0
+    assert len(store.session("old")) == 1
+    store.ttl = 0
+    assert store.purge() == 1
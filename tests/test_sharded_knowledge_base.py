@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+import pytest
+
+from knowledge_base import KnowledgeBase, _Index, top_matches
+from sharded_knowledge_base import MAX_RESTARTS, ShardedKnowledgeBase, _ShardPool
+
+
+@pytest.fixture
+def kb(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((40, 16)).astype(np.float32)
+    dataset = [{"symptom": f"symptom {i}"} for i in range(len(embeddings))]
+    kb = ShardedKnowledgeBase(str(tmp_path / "cache.json"), num_shards=3, lanes=2)
+    kb._publish(_Index(1, dataset, embeddings, KnowledgeBase._normalize(embeddings)))
+    yield kb
+    kb.close()
+
+
+def queries(count, seed=1):
+    rng = np.random.default_rng(seed)
+    return KnowledgeBase._normalize(rng.standard_normal((count, 16)).astype(np.float32))
+
+
+def test_search_matrix_is_backed_by_the_shared_block(kb):
+    shared = np.ndarray(kb._search_matrix.shape, dtype=np.float32, buffer=kb._pool.shm.buf)
+    assert np.shares_memory(kb._search_matrix, shared)
+
+
+def test_concurrent_searches_match_a_single_process_search(kb):
+    batches = [queries(5, seed) for seed in range(8)]
+    results = [None] * len(batches)
+
+    def search(i):
+        results[i] = kb._search(batches[i], 0.0, 3)[1]
+
+    threads = [threading.Thread(target=search, args=(i,)) for i in range(len(batches))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for batch, result in zip(batches, results):
+        expected = top_matches(kb._search_matrix, batch, 0.0, 3)
+        assert [[idx for idx, _ in matches] for matches in result] == [
+            [idx for idx, _ in matches] for matches in expected
+        ]
+
+
+def test_dead_worker_restarts_the_pool(kb):
+    pool = kb._pool
+    pool.workers[0].kill()
+    pool.workers[0].join()
+
+    _, results = kb._search(queries(2), -1.0, 40)
+    assert kb._pool is not pool
+    assert all(len(matches) == 40 for matches in results)
+
+
+def test_search_gives_up_after_max_restarts(kb, monkeypatch):
+    pools = []
+
+    def fail(pool, *args):
+        pools.append(pool)
+        pool.broken = True
+        return None
+
+    monkeypatch.setattr(_ShardPool, "scatter_gather", fail)
+    with pytest.raises(RuntimeError, match="restarts"):
+        kb._search(queries(1), 0.0, 3)
+    assert len(set(pools)) == MAX_RESTARTS + 1
+
+
+def test_workers_are_spawned(kb):
+    assert all(type(worker).__name__ == "SpawnProcess" for worker in kb._pool.workers)
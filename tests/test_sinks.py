@@ -0,0 +1,43 @@
+import gc
+import io
+import threading
+import time
+
+from sinks import ConsoleSink
+
+
+def test_stalled_stream_is_flushed_by_the_timer():
+    stream = io.StringIO()
+    sink = ConsoleSink(flush_interval=0.05, stream=stream)
+    sink.write("DiagnosticAgent", "GREEN", "partial answer")
+    assert stream.getvalue() == ""
+
+    time.sleep(0.3)
+    assert "partial answer" in stream.getvalue()
+
+
+def test_writes_are_batched_per_thread():
+    stream = io.StringIO()
+    sink = ConsoleSink(flush_interval=10, stream=stream)
+
+    def respond(text):
+        for char in text:
+            sink.write("agent", "BLUE", char)
+        sink.flush()
+
+    threads = [threading.Thread(target=respond, args=(text,)) for text in ("aaaa", "bbbb")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert "aaaa" in stream.getvalue() and "bbbb" in stream.getvalue()
+
+
+def test_unused_sink_stops_its_flush_thread():
+    sink = ConsoleSink(flush_interval=0.02, stream=io.StringIO())
+    sink.write("agent", "RED", "text")
+    flusher = sink._flusher
+    del sink
+    gc.collect()
+    flusher.join(1)
+    assert not flusher.is_alive()
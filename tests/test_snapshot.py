@@ -0,0 +1,108 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from knowledge_base import KnowledgeBase
+from snapshot import (
+    ALIGNMENT, MAGIC, load_current_snapshot, load_snapshot, source_digest, write_snapshot
+)
+from test_knowledge_base import FakeClient, row
+
+
+def test_round_trip_keeps_arrays_aligned(tmp_path):
+    path = str(tmp_path / "startup.snapshot")
+    arrays = {
+        "odd": np.arange(7, dtype=np.int8),
+        "matrix": np.arange(15, dtype=np.float32).reshape(5, 3),
+        "empty": np.zeros((0, 4), dtype=np.float32),
+        "indices": np.arange(6, dtype=np.int32).reshape(3, 2),
+    }
+    write_snapshot(path, {"dataset": "symptoms.csv"}, [row("Cough")], arrays, "abc", {"k": 2})
+
+    snapshot = load_snapshot(path)
+    assert snapshot.config == {"dataset": "symptoms.csv"}
+    assert snapshot.dataset == [row("Cough")]
+    assert snapshot.source == "abc"
+    assert snapshot.header["k"] == 2
+    for name, array in arrays.items():
+        assert snapshot.arrays[name].dtype == array.dtype
+        assert np.array_equal(snapshot.arrays[name], array)
+
+    with open(path, "rb") as file:
+        file.seek(len(MAGIC))
+        (header_length,) = struct.unpack("<Q", file.read(8))
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    assert data_start % ALIGNMENT == 0
+    for name, array in snapshot.arrays.items():
+        if array.size:
+            assert array.offset % ALIGNMENT == 0
+            assert array.offset == data_start + snapshot.header["arrays"][name]["offset"]
+
+
+def test_missing_or_foreign_file_is_not_a_snapshot(tmp_path):
+    path = tmp_path / "startup.snapshot"
+    assert load_snapshot(str(path)) is None
+    path.write_bytes(b"not a snapshot")
+    assert load_snapshot(str(path)) is None
+
+
+@pytest.fixture
+def files(tmp_path):
+    config_path = tmp_path / "agent.json"
+    dataset_path = tmp_path / "symptoms.csv"
+    config_path.write_text(json.dumps({"dataset": str(dataset_path)}))
+    dataset_path.write_text("symptom,conditions,follow_up_questions\nCough,flu,How long?\n")
+    return str(config_path), str(dataset_path)
+
+
+def write_for(path, config_path, dataset_path):
+    source = source_digest([config_path, dataset_path])
+    write_snapshot(path, {"dataset": dataset_path}, [row("Cough")], {}, source)
+
+
+def test_current_snapshot_is_loaded(tmp_path, files):
+    path = str(tmp_path / "startup.snapshot")
+    write_for(path, *files)
+    assert load_current_snapshot(path, files[0]) is not None
+
+
+def test_snapshot_of_an_edited_dataset_is_rejected(tmp_path, files):
+    path = str(tmp_path / "startup.snapshot")
+    config_path, dataset_path = files
+    write_for(path, config_path, dataset_path)
+    with open(dataset_path, "a") as file:
+        file.write("Fever,flu,How high?\n")
+    assert load_current_snapshot(path, config_path) is None
+
+
+def test_snapshot_with_a_missing_dataset_is_rejected(tmp_path, files):
+    path = str(tmp_path / "startup.snapshot")
+    config_path, dataset_path = files
+    write_for(path, config_path, dataset_path)
+    (tmp_path / "symptoms.csv").unlink()
+    assert load_current_snapshot(path, config_path) is None
+
+
+def test_loaded_snapshot_searches_like_the_loaded_dataset(tmp_path):
+    client = FakeClient()
+    dataset = [row(f"Symptom {i}", conditions=f"condition {i}") for i in range(12)]
+    kb = KnowledgeBase(
+        str(tmp_path / "cache.json"), projection_dim=4, client=client, neighbor_k=3
+    )
+    kb.load_dataset(dataset)
+    arrays, extra = kb.snapshot_arrays()
+    path = str(tmp_path / "startup.snapshot")
+    write_snapshot(path, {}, dataset, arrays, "abc", extra)
+
+    restored = KnowledgeBase(str(tmp_path / "other.json"), client=client)
+    restored.load_snapshot(load_snapshot(path))
+    assert restored.dataset == kb.dataset
+    assert restored.projection.method == kb.projection.method
+    assert np.array_equal(restored.graph.indices, kb.graph.indices)
+    queries = [f"symptom {i}" for i in range(0, 12, 3)] + ["something else"]
+    for expand in (False, True):
+        assert restored.get_relevant_entries_batch(
+            queries, threshold=0.0, top_k=5, expand=expand
+        ) == kb.get_relevant_entries_batch(queries, threshold=0.0, top_k=5, expand=expand)